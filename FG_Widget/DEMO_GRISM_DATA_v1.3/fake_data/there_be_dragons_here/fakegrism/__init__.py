@@ -0,0 +1,45 @@
+''' Synthetic FORCAST grism data generator.
+
+    import fakegrism
+    result = fakegrism.generate(preset='G1xG2', seed=1, data_file='g1xg2.fits')
+
+or, from the command line, python -m fakegrism --help.
+
+Modules that are also run as scripts (python -m fakegrism.campaign or
+fakegrism.reduce) are only imported when one of their names is first used,
+so that running them does not import them twice.
+'''
+import importlib
+
+from fakegrism.psf import draw_airy, draw_gaussian, airy_profile, airy_scale, RadialPSF, radial_psf, wavelength_bin
+from fakegrism.grism import Grism, GRISMS, TraceModel, focal_plane_position, focal_plane_angle
+from fakegrism.slit import Slit, slit_kernels, source_kernel, sky_kernels, slit_convolver, clear_kernel_cache
+from fakegrism.convolve import SkyConvolver, element_kernel, binned_psf
+from fakegrism.render import order_trace, stamp_offsets, subpixel_offsets, shift_stamps, add_stamps, place_stamps, render_order, render_box, add_box
+from fakegrism.frames import padded_grid, iter_frames, iter_tiles, generate_frames
+from fakegrism.scene import Scene, source_samples
+from fakegrism.spectrum import line_spectrum, order_spectra, random_lines, random_spectrum
+from fakegrism.truth import write_truth, read_truth, truth_table
+from fakegrism.noise import NoiseModel
+from fakegrism.dark import dark_frames, iter_dark_frames
+from fakegrism.pipeline import DEFAULTS, PRESETS, make_config, order_slits, NodSequence, generate
+from fakegrism.fitsio import write_cube, read_cube, CubeWriter
+from fakegrism.lookup import WavelengthTable, wavelength_table
+from fakegrism.atran import load_atran, order_wavelengths, order_transmission
+from fakegrism.cache import cache_dir, cached_array
+from fakegrism.instrument import Profiler
+from fakegrism.calib import master_dark, master_flat
+
+_LAZY = {
+    'Campaign': 'fakegrism.campaign',
+    'sweep_points': 'fakegrism.campaign',
+    'dataset_key': 'fakegrism.campaign',
+    'reduce_nods': 'fakegrism.reduce',
+    'validate': 'fakegrism.reduce',
+}
+
+
+def __getattr__(name):
+    if name not in _LAZY:
+        raise AttributeError('module %r has no attribute %r' % (__name__, name))
+    return getattr(importlib.import_module(_LAZY[name]), name)
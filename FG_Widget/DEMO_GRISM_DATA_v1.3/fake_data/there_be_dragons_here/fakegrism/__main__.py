@@ -0,0 +1,5 @@
+import sys
+
+from fakegrism.cli import main
+
+sys.exit(main())
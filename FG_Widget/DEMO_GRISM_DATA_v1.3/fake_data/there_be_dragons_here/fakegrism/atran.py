@@ -0,0 +1,141 @@
+''' Telluric transmission from the ATRAN models in FG_Widget/atran.
+
+The models are IDL save files of about half a million (wavelength,
+transmission) samples.  Each is read once, converted to a (3, n) float64
+array of wavelength (microns), transmission and the running integral of the
+transmission over wavelength, and kept in the on-disk cache (see
+fakegrism.cache) under the hash of the file's contents; later loads memory
+map it.
+
+The transmission seen by a detector column is the mean of the model over
+the wavelengths that column covers, taken from the running integral at the
+column edges, so resampling costs two interpolations per column whatever
+the resolution of the model.  Column wavelengths come from the grism
+lookup tables (fakegrism.lookup).
+
+    wavelength = order_wavelengths(GRISMS['G1'], orders, m)
+    transmission = order_transmission('R1000', wavelength)
+'''
+import hashlib
+import os
+import numpy
+
+from fakegrism.cache import cache_dir, cached_array
+from fakegrism.lookup import wavelength_table
+
+ATRAN_VERSION = 1
+ATRAN_DIR = os.environ.get('FAKEGRISM_ATRAN',
+                           os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..', '..', 'atran'))
+ATRAN_MODELS = {
+    'R200': 'atran_5-8_R200',
+    'R1000': 'atran_5-8_R1000',
+    'R5000': 'atran_5-8_R5000',
+}
+
+_models = {}
+
+
+def model_file(model, atran_dir=None):
+    ''' The save file of model, which is either a key of ATRAN_MODELS or a
+    file name. '''
+    filename = ATRAN_MODELS.get(model, model)
+    if not os.path.isabs(filename):
+        filename = os.path.join(atran_dir or ATRAN_DIR, filename)
+    if not os.path.exists(filename):
+        raise IOError('no ATRAN model %r (looked for %s)' % (model, filename))
+    return filename
+
+
+def read_atran(filename):
+    ''' (3, n) array of wavelength, transmission and running integral of the
+    transmission, sorted by wavelength, from an IDL save file holding wvlt
+    and intt arrays. '''
+    from scipy.io import readsav
+    save = readsav(filename)
+    wl = numpy.asarray(save['wvlt'], dtype=numpy.float64)
+    transmission = numpy.asarray(save['intt'], dtype=numpy.float64)
+    order = numpy.argsort(wl, kind='stable')
+    wl = wl[order]
+    transmission = transmission[order]
+    integral = numpy.concatenate([[0.0], numpy.cumsum(0.5*(transmission[1:]+transmission[:-1])*numpy.diff(wl))])
+    return numpy.array([wl, transmission, integral])
+
+
+def file_digest(filename):
+    ''' sha1 of the contents of filename. '''
+    sha1 = hashlib.sha1()
+    with open(filename, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            sha1.update(block)
+    return sha1.hexdigest()
+
+
+def load_atran(model='R1000', atran_dir=None, path=None):
+    ''' The (3, n) array of model (see read_atran), from memory, then from the
+    disk cache, and only then read from the save file.  The disk cache is
+    keyed on the contents of the save file, so a model that is regenerated,
+    or another model of the same name, is never given a stale entry; in
+    memory, models are kept per file, modification time, size and cache
+    directory, so the file is only hashed again when it changes. '''
+    filename = os.path.abspath(model_file(model, atran_dir))
+    stat = os.stat(filename)
+    key = (filename, stat.st_mtime_ns, stat.st_size, os.path.abspath(cache_dir(path)))
+    if key not in _models:
+        params = dict(version=ATRAN_VERSION, sha1=file_digest(filename))
+        _models[key] = cached_array('atran', params, lambda: read_atran(filename), path)
+    return _models[key]
+
+
+def order_wavelengths(grism, orders, m, nx=256, x0=None):
+    ''' Wavelength (microns) at the center of each column of each order;
+    orders are (x_right, x_left, ...) endpoints, m the grism order of each
+    and the optical axis is at column x0 (default: the detector center).
+    Columns an order cannot reach, and the whole of order 0, are NaN. '''
+    x0 = nx/2.0 if x0 is None else x0
+    wavelength = []
+    for order, m_order in zip(orders, m):
+        columns = numpy.arange(order[1], order[0]) + 0.5
+        if m_order == 0:
+            wavelength.append(numpy.full(len(columns), numpy.nan))
+        else:
+            wavelength.append(wavelength_table(grism, m_order).to_wavelength(columns - x0))
+    return wavelength
+
+
+def mean_transmission(atran, wl_a, wl_b):
+    ''' Mean transmission of atran (a load_atran array) between wavelengths
+    wl_a and wl_b.  Where the interval does not overlap the model at all (or
+    either end is NaN) the transmission is 1. '''
+    wl, transmission, integral = atran
+    lo = numpy.clip(numpy.minimum(wl_a, wl_b), wl[0], wl[-1])
+    hi = numpy.clip(numpy.maximum(wl_a, wl_b), wl[0], wl[-1])
+    result = numpy.ones(numpy.shape(lo))
+    with numpy.errstate(invalid='ignore'):
+        span = hi - lo
+        wide = span > 0
+        point = (span == 0) & (lo > wl[0]) & (hi < wl[-1])
+    result[wide] = (numpy.interp(hi[wide], wl, integral) - numpy.interp(lo[wide], wl, integral))/span[wide]
+    result[point] = numpy.interp(lo[point], wl, transmission)
+    return result
+
+
+def column_edges(wavelength):
+    ''' Wavelengths of the edges of columns centered on wavelength (one
+    more than there are columns), half way between neighbouring centers. '''
+    wavelength = numpy.asarray(wavelength, dtype=float)
+    if len(wavelength) < 2:
+        return numpy.concatenate([wavelength, wavelength])
+    mid = 0.5*(wavelength[1:]+wavelength[:-1])
+    return numpy.concatenate([[2.0*wavelength[0]-mid[0]], mid, [2.0*wavelength[-1]-mid[-1]]])
+
+
+def order_transmission(model, wavelength, atran_dir=None, path=None):
+    ''' Telluric transmission of each column of each order, for column center
+    wavelengths as given by order_wavelengths.  All orders are resampled in
+    one pass. '''
+    atran = load_atran(model, atran_dir, path)
+    edges = [column_edges(wl) for wl in wavelength]
+    lo = numpy.concatenate([e[:-1] for e in edges] + [numpy.zeros(0)])
+    hi = numpy.concatenate([e[1:] for e in edges] + [numpy.zeros(0)])
+    transmission = mean_transmission(atran, lo, hi)
+    return numpy.split(transmission, numpy.cumsum([len(wl) for wl in wavelength])[:-1])
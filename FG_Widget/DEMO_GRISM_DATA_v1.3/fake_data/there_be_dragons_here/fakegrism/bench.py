@@ -0,0 +1,439 @@
+''' Timings for the synthetic data generator.
+
+Run from the there_be_dragons_here directory.  With no options, the
+optimized code is timed against the original implementations, and the
+largest difference between the two reported:
+
+    python -m fakegrism.bench
+
+That the two agree is tested, without the timings, in
+tests/test_equivalence.py, which uses the reference implementations here.
+
+--suite times every stage of the generator (PSF, slit images, grism
+dispersion, spectrum synthesis, order rendering, whole frames and whole
+cubes) over several slit lengths and detector sizes, for the G1 and G1xG2
+setups.  The results can be saved as JSON, and compared with a saved
+baseline; any case more than --tolerance slower than the baseline is
+reported as a regression, and the exit status is then 1:
+
+    python -m fakegrism.bench --suite -o baseline.json
+    python -m fakegrism.bench --suite -o today.json --baseline baseline.json
+'''
+import argparse
+import datetime
+import json
+import os
+import platform
+import sys
+import tempfile
+import timeit
+import numpy
+import scipy.special
+
+from fakegrism.psf import draw_airy, radial_psf
+from fakegrism.slit import Slit, sky_kernels, clear_kernel_cache
+from fakegrism.scene import Scene
+from fakegrism.render import order_trace, render_order, render_box
+from fakegrism.frames import padded_grid, generate_frames
+from fakegrism.grism import GRISMS
+from fakegrism.spectrum import random_lines, order_spectra
+from fakegrism.pipeline import NodSequence, make_config, order_endpoints
+
+
+def draw_airy_reference(X, Y, x_c, y_c, wl):
+    ''' The original per-pixel draw_airy from fake_airy.py, kept as the
+    reference for timing and numerical comparison. '''
+    pixel_size = 50e-4 # length of side of pixel (in cm)
+    l = wl/pixel_size
+    f_length = 15.494/pixel_size # focal length (in pixels)
+    d = 2.54/pixel_size # Beam diameter (in pixels)
+    r = [((X-x_c)**2+(Y-y_c)**2)**(0.5)] # radius from optical axis (in pixels)
+    bm = numpy.where(r[0] < 15)
+    x_airy = 3.1415926*(numpy.array(r))/((l*(f_length/d)))
+    image = numpy.zeros([len(X), len(X[0])])
+    for pixel in zip(*bm):
+        with numpy.errstate(invalid='ignore'):
+            image[pixel[0]][pixel[1]] = ((2*scipy.special.jv(1, x_airy[0][pixel[0]][pixel[1]])/x_airy[0][pixel[0]][pixel[1]])**2.0)
+        if numpy.isnan(image[pixel[0]][pixel[1]]):
+            image[pixel[0]][pixel[1]] = 1.0
+    return image
+
+
+def slit_image_reference(slit, y_strength, wl=8e-4):
+    ''' The original Slit.slit_image from fake_airy.py, which rebuilds every
+    PSF on every call. '''
+    x = numpy.arange(0, slit.width*slit.width_mult+1, 1.0)
+    y = numpy.arange(0, slit.length*slit.length_mult+1, 1.0)
+    X, Y = numpy.meshgrid(x, y)
+    ptsource = draw_airy_reference(X, Y, len(x)/2.0, len(y)/2.0+(slit.object_location-0.5)*slit.length, wl)
+    sky = numpy.zeros([len(y), len(x)])
+    for i in numpy.arange(len(x)/2.0-slit.width/2.0, len(x)/2.0+slit.width/2.0, 1.0):
+        for j in numpy.arange(len(y)/2.0-slit.length/2.0, len(y)/2.0+slit.length/2.0, 1.0):
+            sky += ((numpy.random.randn(1))**2.0)*draw_airy_reference(X, Y, i, j, wl)
+    composite = numpy.round(10.0*sky) + numpy.round(ptsource*500.0*y_strength)
+    return composite
+
+
+def sky_kernels_reference(width, length, oversample, wl=8e-4):
+    ''' Oversampled sky kernels done directly: for every slit position, one
+    Airy PSF on the oversampled stamp per sub-position, binned to pixels. '''
+    x = numpy.arange(0, width*3+1, 1.0)
+    y = numpy.arange(0, length*3+1, 1.0)
+    sub = (numpy.arange(oversample)+0.5)/oversample - 0.5
+    X, Y = numpy.meshgrid((x[:, numpy.newaxis]+sub).ravel(), (y[:, numpy.newaxis]+sub).ravel())
+    kernels = []
+    for i in numpy.arange(len(x)/2.0-width/2.0, len(x)/2.0+width/2.0, 1.0):
+        for j in numpy.arange(len(y)/2.0-length/2.0, len(y)/2.0+length/2.0, 1.0):
+            fine = sum(draw_airy(X, Y, i+s, j+t, wl) for s in sub for t in sub)/oversample**2
+            kernels.append(fine.reshape(len(y), oversample, len(x), oversample).mean(axis=(1, 3)))
+    return numpy.array(kernels)
+
+
+def best_time(func, repeat=5, number=1):
+    ''' Best wall-clock time (in seconds) of a single call to func. '''
+    return min(timeit.repeat(func, repeat=repeat, number=number))/number
+
+
+def bench_airy(wl=8e-4):
+    ''' Times draw_airy against the reference on a slit-sized stamp. '''
+    x = numpy.arange(0, 7.0)
+    y = numpy.arange(0, 46.0)
+    X, Y = numpy.meshgrid(x, y)
+    centers = [(3.5, 23.0), (3.0, 23.0), (0.0, 0.0), (2.25, 40.75)]
+    max_diff = max(numpy.abs(draw_airy(X, Y, x_c, y_c, wl) - draw_airy_reference(X, Y, x_c, y_c, wl)).max()
+                   for x_c, y_c in centers)
+    t_old = best_time(lambda: draw_airy_reference(X, Y, 3.5, 23.0, wl))
+    t_new = best_time(lambda: draw_airy(X, Y, 3.5, 23.0, wl))
+    return {'name': 'draw_airy', 'reference': t_old, 'time': t_new, 'max_diff': max_diff}
+
+
+def bench_airy_table(wl=8e-4):
+    ''' Times the radial lookup table of the Airy PSF against draw_airy on a
+    dense 31 x 31 stamp (every pixel inside the truncation radius). '''
+    X, Y = numpy.meshgrid(numpy.arange(0, 31.0), numpy.arange(0, 31.0))
+    table = radial_psf('airy', wl, None)
+    max_diff = numpy.abs(table(X, Y, 15.5, 15.25) - draw_airy(X, Y, 15.5, 15.25, wl)).max()
+    t_old = best_time(lambda: draw_airy(X, Y, 15.5, 15.25, wl))
+    t_new = best_time(lambda: table(X, Y, 15.5, 15.25))
+    return {'name': 'airy_table', 'reference': t_old, 'time': t_new, 'max_diff': max_diff}
+
+
+def bench_slit_image(width=2, length=15, seed=1):
+    ''' Times Slit.slit_image against the reference on the cross-dispersed
+    slit, both drawing the same sky for the same seed. '''
+    slit = Slit(width, length)
+    slit.point_source(0.25)
+    numpy.random.seed(seed)
+    old = slit_image_reference(slit, 0.8)
+    numpy.random.seed(seed)
+    new = slit.slit_image(0.8)
+    t_old = best_time(lambda: slit_image_reference(slit, 0.8), repeat=3)
+    t_new = best_time(lambda: slit.slit_image(0.8), repeat=5, number=100)
+    return {'name': 'slit_image', 'reference': t_old, 'time': t_new,
+            'max_diff': numpy.abs(new-old).max()}
+
+
+def render_order_reference(Z, X, Y, stamps, xrange, y_c):
+    ''' The original per-column placement, one full-frame mask per stamp. '''
+    for xpos, yc, subimage in zip(xrange, y_c, stamps):
+        xdim = len(subimage[0])
+        ydim = len(subimage)
+        mask = numpy.where( (X >= xpos-(numpy.floor(xdim/2.0))) & (X < xpos+(numpy.floor(xdim/2.0) + numpy.round(xdim % 2))) & (Y >= yc-(numpy.floor(ydim/2.0))) & (Y < yc+(numpy.floor(ydim/2.0) + numpy.round(ydim % 2))))
+        Z[mask] += subimage.reshape(1, xdim*ydim)[0]
+    return Z
+
+
+def bench_render_order(width=2, length=15, seed=1):
+    ''' Times placing every column of a tilted cross-dispersed order (G1xG2
+    order 1) against the per-column masks. '''
+    slit = Slit(width, length)
+    slit.point_source(0.25)
+    x, y = padded_grid(slit)
+    X, Y = numpy.meshgrid(x, y)
+    numpy.random.seed(seed)
+    xrange, y_c = order_trace(255, 0, 210, 162, slit.length/2.0)
+    stamps = slit.slit_images(numpy.random.rand(len(xrange)))
+    old = render_order_reference(numpy.zeros(X.shape), X, Y, stamps, xrange, y_c)
+    new = render_order(numpy.zeros(X.shape), x[0], y[0], stamps, xrange, y_c)
+    t_old = best_time(lambda: render_order_reference(numpy.zeros(X.shape), X, Y, stamps, xrange, y_c), repeat=3)
+    t_new = best_time(lambda: render_order(numpy.zeros(X.shape), x[0], y[0], stamps, xrange, y_c), number=10)
+    return {'name': 'render_order', 'reference': t_old, 'time': t_new,
+            'max_diff': numpy.abs(new-old).max()}
+
+
+def centroid_errors(slit, order, step=8):
+    ''' How far (in pixels) the centroid of the sub-pixel image of the point
+    source of slit is from the trace of order (x_right, x_left, y_right,
+    y_left), in every step-th column alone, so that neighbouring stamps do
+    not overlap. '''
+    x, y = padded_grid(slit)
+    xrange, y_c = order_trace(order[0], order[1], order[2], order[3], slit.length/2.0)
+    stamp = slit.source()
+    ydim = stamp.shape[0]
+    offset = (stamp.sum(axis=1)*numpy.arange(ydim)).sum()/stamp.sum() - numpy.floor(ydim/2.0)
+    error = []
+    for xc, yc in zip(xrange[::step], y_c[::step]):
+        Z = render_order(numpy.zeros((len(y), len(x))), x[0], y[0], stamp[numpy.newaxis], [xc], [yc], subpixel=True)
+        profile = Z.sum(axis=1)
+        error.append(abs((profile*y).sum()/profile.sum() - (yc+offset)))
+    return numpy.array(error)
+
+
+def bench_subpixel(width=2, length=15, seed=1):
+    ''' Times sub-pixel placement of a tilted order (G1xG2 order 1) against
+    placement on the pixel grid; max |diff| is the worst distance of the
+    centroid from the trace (see centroid_errors). '''
+    slit = Slit(width, length)
+    slit.point_source(0.5)
+    x, y = padded_grid(slit)
+    xrange, y_c = order_trace(255, 0, 210, 162, slit.length/2.0)
+    stamps = numpy.repeat(slit.source()[numpy.newaxis], len(xrange), axis=0)
+    error = centroid_errors(slit, (255, 0, 210, 162))
+    t_old = best_time(lambda: render_order(numpy.zeros((len(y), len(x))), x[0], y[0], stamps, xrange, y_c), number=10)
+    t_new = best_time(lambda: render_order(numpy.zeros((len(y), len(x))), x[0], y[0], stamps, xrange, y_c,
+                                           subpixel=True), number=10)
+    return {'name': 'subpixel', 'reference': t_old, 'time': t_new, 'max_diff': max(error)}
+
+
+def bench_oversample(width=2, length=15, oversample=4):
+    ''' Times building oversampled sky kernels from the FFT element kernel
+    against building them directly. '''
+    def build():
+        clear_kernel_cache()
+        return sky_kernels(width, length, 3, 3, 8e-4, oversample=oversample)
+    old = sky_kernels_reference(width, length, oversample)
+    new = build()
+    t_old = best_time(lambda: sky_kernels_reference(width, length, oversample), repeat=1)
+    t_new = best_time(build, repeat=3)
+    return {'name': 'oversample', 'reference': t_old, 'time': t_new,
+            'max_diff': numpy.abs(new-old).max()}
+
+
+def scene_images_reference(slit, sources, position, spectra):
+    ''' Source images of a scene one source at a time: the point source
+    image at each source's position times its spectrum, summed. '''
+    total = 0.0
+    for source, spectrum in zip(sources, spectra):
+        slit.point_source(position + source['offset']/float(slit.length))
+        total = total + slit.source()[numpy.newaxis]*slit.source_flux*(source['flux']*spectrum)[:, numpy.newaxis, numpy.newaxis]
+    return numpy.round(total)
+
+
+def bench_scene(width=2, length=15, n_sources=200, n_columns=255, seed=1):
+    ''' Times the source images of a crowded scene (n_sources point sources,
+    each with its own spectrum, on a quarter pixel grid) made by Scene
+    against adding the sources one at a time. '''
+    rng = numpy.random.default_rng(seed)
+    sources = [{'offset': float(offset), 'flux': 0.01} for offset in rng.integers(-20, 21, n_sources)*0.25]
+    spectra = [rng.random(n_columns) for source in sources]
+    slit = Slit(width, length, dtype=numpy.float64)
+    scene = Scene(sources, [[spectrum] for spectrum in spectra], length)
+    zeros = numpy.zeros((n_columns, slit.n_positions()))
+    def new():
+        positions, flux = scene.order_flux(0.5, 0)
+        return slit.slit_images(flux, weights=zeros, positions=positions)
+    old = scene_images_reference(slit, sources, 0.5, spectra)
+    t_old = best_time(lambda: scene_images_reference(slit, sources, 0.5, spectra), repeat=3)
+    t_new = best_time(new, repeat=3, number=10)
+    return {'name': 'scene', 'reference': t_old, 'time': t_new, 'max_diff': numpy.abs(new()-old).max()}
+
+
+# G1xG2 cross-dispersed order endpoints (x_right, x_left, y_right, y_left)
+G1XG2_ORDERS = list(zip([159, 255, 255, 255, 255, 255, 255, 255],
+                        [0, 0, 0, 0, 0, 0, 0, 0],
+                        [233, 210, 177, 143, 110, 84, 58, 38],
+                        [202, 162, 127, 98, 69, 46, 20, 0]))
+
+
+def bench_frames(n_frames=4, processes=None, seed=1):
+    ''' Times a G1xG2 nod sequence generated serially and on a process
+    pool. '''
+    slit = Slit(2, 15)
+    positions = [0.25, 0.75]*(n_frames//2)
+    rng = numpy.random.default_rng(seed)
+    spectrum = [rng.random(order[0]-order[1]) for order in G1XG2_ORDERS]
+    serial = generate_frames(slit, positions, G1XG2_ORDERS, spectrum, seed=seed, processes=1)
+    parallel = generate_frames(slit, positions, G1XG2_ORDERS, spectrum, seed=seed, processes=processes)
+    t_serial = best_time(lambda: generate_frames(slit, positions, G1XG2_ORDERS, spectrum, seed=seed, processes=1), repeat=3)
+    t_parallel = best_time(lambda: generate_frames(slit, positions, G1XG2_ORDERS, spectrum, seed=seed, processes=processes), repeat=3)
+    return {'name': 'frames', 'reference': t_serial, 'time': t_parallel,
+            'max_diff': numpy.abs(serial-parallel).max()}
+
+
+SUITE_VERSION = 1
+SLIT_LENGTHS = [15, 64, 256]
+DETECTOR_SIZES = [256, 512, 1024]
+SETUPS = ['G1', 'G1xG2']
+
+
+def scaled_config(preset, size, **overrides):
+    ''' The config of preset on a size x size detector, its order endpoints
+    scaled up from the 256 x 256 originals. '''
+    config = make_config(preset=preset, nx=size, ny=size, seed=1, **overrides)
+    for key in ('x_right', 'x_left', 'y_right', 'y_left'):
+        config[key] = [int(value*size//256) for value in config[key]]
+    return config
+
+
+def suite_cases(quick=False):
+    ''' (name, params, func, number) for every case of the suite; func takes
+    no arguments and does the work once (number times per timing).  quick
+    leaves out the largest slit and detector. '''
+    lengths = SLIT_LENGTHS[:-1] if quick else SLIT_LENGTHS
+    sizes = DETECTOR_SIZES[:-1] if quick else DETECTOR_SIZES
+    cases = []
+
+    for length in lengths:
+        x = numpy.arange(0, 7.0)
+        y = numpy.arange(0, length*3+1.0)
+        X, Y = numpy.meshgrid(x, y)
+        cases.append(('draw_airy', {'length': length},
+                      lambda X=X, Y=Y, y_c=len(y)/2.0: draw_airy(X, Y, 3.5, y_c, 8e-4), 20))
+
+    for length in lengths:
+        slit = Slit(2, length)
+        slit.point_source(0.25)
+        slit.slit_image(0.8)   # builds the cached kernels outside the timing
+        cases.append(('slit_image', {'length': length}, lambda slit=slit: slit.slit_image(0.8), 20))
+
+    wl = numpy.linspace(4.9, 7.8, 4096)
+    m = numpy.arange(1, 5).reshape(-1, 1)    # the orders of G1 that reach 7.8 microns
+    cases.append(('calc_beta', {'orders': 4, 'samples': len(wl)},
+                  lambda: GRISMS['G1'].calc_beta(wl, m), 20))
+
+    for setup in SETUPS:
+        for size in sizes:
+            orders = order_endpoints(scaled_config(setup, size))
+            lines = random_lines(orders, numpy.random.default_rng(1), 30*size//256)
+            cases.append(('spectrum', {'setup': setup, 'size': size},
+                          lambda orders=orders, lines=lines: order_spectra(orders, *lines), 10))
+
+    for length in lengths:
+        slit = Slit(2, length)
+        slit.point_source(0.25)
+        xrange, y_c = order_trace(255, 0, 210, 162, slit.length/2.0)
+        stamps = slit.slit_images(numpy.random.default_rng(1).random(len(xrange)))
+        for subpixel in (False, True):
+            cases.append(('render_order', {'length': length, 'subpixel': subpixel},
+                          lambda stamps=stamps, xrange=xrange, y_c=y_c, subpixel=subpixel:
+                          render_box(stamps, xrange, y_c, subpixel), 10))
+
+    for setup in SETUPS:
+        for size in sizes:
+            sequence = NodSequence(scaled_config(setup, size, n_frames=1))
+            cases.append(('frame', {'setup': setup, 'size': size}, lambda sequence=sequence: sequence.frames(), 1))
+
+    for setup in SETUPS:
+        sequence = NodSequence(scaled_config(setup, 256, n_frames=16))
+        cases.append(('cube', {'setup': setup, 'size': 256, 'n_frames': 16},
+                      lambda sequence=sequence: sequence.frames(), 1))
+        cases.append(('cube_file', {'setup': setup, 'size': 256, 'n_frames': 16},
+                      lambda sequence=sequence: write_temporary(sequence), 1))
+    return cases
+
+
+def write_temporary(sequence):
+    ''' Streams sequence to a temporary FITS file, then deletes it. '''
+    handle, filename = tempfile.mkstemp(suffix='.fits')
+    os.close(handle)
+    try:
+        sequence.write(filename)
+    finally:
+        os.remove(filename)
+
+
+def case_key(name, params):
+    return '%s[%s]' % (name, ','.join('%s=%s' % item for item in sorted(params.items())))
+
+
+def run_suite(quick=False, repeat=3, stream=None):
+    ''' Times every suite case (best of repeat) and returns the results as
+    a JSON-ready dict. '''
+    results = []
+    for name, params, func, number in suite_cases(quick):
+        func()   # warms any caches the case relies on
+        seconds = best_time(func, repeat=repeat, number=number)
+        results.append({'key': case_key(name, params), 'name': name, 'params': params, 'time': seconds})
+        if stream is not None:
+            stream.write('%-48s %10.3f ms\n' % (results[-1]['key'], seconds*1e3))
+    return {
+        'version': SUITE_VERSION,
+        'date': datetime.datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'numpy': numpy.__version__,
+        'platform': platform.platform(),
+        'quick': quick,
+        'results': results,
+    }
+
+
+def compare(results, baseline, tolerance=0.25):
+    ''' (key, time, baseline time or None, status) for every case of
+    results.  status is 'regression' when a case is more than tolerance
+    (a fraction) slower than in baseline, 'new' when baseline lacks it and
+    'ok' otherwise. '''
+    before = dict((result['key'], result['time']) for result in baseline['results'])
+    rows = []
+    for result in results['results']:
+        old = before.get(result['key'])
+        if old is None:
+            status = 'new'
+        elif result['time'] > old*(1.0+tolerance):
+            status = 'regression'
+        else:
+            status = 'ok'
+        rows.append((result['key'], result['time'], old, status))
+    return rows
+
+
+def check():
+    ''' Times the optimized code against the originals. '''
+    for result in [bench_airy(), bench_airy_table(), bench_slit_image(), bench_render_order(), bench_subpixel(), bench_oversample(), bench_scene(), bench_frames()]:
+        print('%-12s reference %9.3f ms   new %9.3f ms   speedup %6.1fx   max |diff| %.2e' % (
+            result['name'], result['reference']*1e3, result['time']*1e3,
+            result['reference']/result['time'], result['max_diff']))
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='python -m fakegrism.bench',
+                                     description='Benchmarks the synthetic data generator.')
+    parser.add_argument('--suite', action='store_true', help='run the timing suite instead of the reference comparisons')
+    parser.add_argument('--quick', action='store_true', help='leave out the largest slit and detector')
+    parser.add_argument('-r', '--repeat', type=int, default=3, help='timings per case (the best is kept)')
+    parser.add_argument('-o', '--output', help='JSON file for the suite results')
+    parser.add_argument('-b', '--baseline', help='JSON results to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='slowdown (as a fraction) that counts as a regression')
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if not args.suite:
+        check()
+        return 0
+
+    results = run_suite(args.quick, args.repeat, stream=sys.stdout)
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=1, sort_keys=True)
+    if not args.baseline:
+        return 0
+    with open(args.baseline) as file:
+        baseline = json.load(file)
+    regressions = 0
+    print('')
+    for key, seconds, old, status in compare(results, baseline, args.tolerance):
+        if old is None:
+            print('%-48s %10.3f ms %13s   %s' % (key, seconds*1e3, '', status))
+        else:
+            print('%-48s %10.3f ms %10.3f ms   %5.2fx %s' % (key, seconds*1e3, old*1e3, seconds/old, status))
+        regressions += (status == 'regression')
+    if regressions:
+        print('%d regression(s) beyond %d%%' % (regressions, round(args.tolerance*100)))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
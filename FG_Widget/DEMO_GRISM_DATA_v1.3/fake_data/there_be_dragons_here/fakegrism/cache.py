@@ -0,0 +1,48 @@
+''' Content-addressed on-disk cache of numpy arrays.
+
+An array is stored as <kind>_<hash>.npy in the cache directory
+($FAKEGRISM_CACHE, or ~/.cache/fakegrism), where the hash covers the kind
+and every parameter the array was generated from.  Changing any parameter
+gives a new name, so stale entries are never read back; unused ones can
+simply be deleted.  Entries are written once (atomically) and then memory
+mapped read-only on every load.
+'''
+import hashlib
+import os
+import numpy
+
+
+def cache_dir(path=None):
+    ''' The cache directory, created if need be. '''
+    if path is None:
+        path = os.environ.get('FAKEGRISM_CACHE', os.path.join(os.path.expanduser('~'), '.cache', 'fakegrism'))
+    #exist_ok: processes sharing a new cache may all try to create it
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def param_hash(kind, params):
+    ''' sha1 of kind and params (a dict of plain values). '''
+    text = repr((kind, sorted((key, repr(value)) for key, value in params.items())))
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def cache_path(kind, params, path=None):
+    return os.path.join(cache_dir(path), '%s_%s.npy' % (kind, param_hash(kind, params)))
+
+
+def save_array(filename, array):
+    ''' Saves array to filename via a temporary file, so that readers never
+    see a partly written entry. '''
+    tmpname = '%s.%d.tmp.npy' % (filename[:-4], os.getpid())
+    numpy.save(tmpname, array)
+    os.rename(tmpname, filename)
+
+
+def cached_array(kind, params, build, path=None):
+    ''' The array for (kind, params), memory mapped from the cache; build() is
+    only called (and its result saved) when there is no entry yet. '''
+    filename = cache_path(kind, params, path)
+    if not os.path.exists(filename):
+        save_array(filename, build())
+    return numpy.load(filename, mmap_mode='r')
@@ -0,0 +1,67 @@
+''' Master dark and flat frames, generated once and reused.
+
+Masters are kept in the on-disk cache (see fakegrism.cache) under a hash of
+the detector configuration, frame count, noise parameters and seed, and are
+returned as read-only memory maps.  Asking again for the same parameters,
+in this or any later run, costs a file open.
+
+    dark = master_dark(256, 256, n_frames=100, seed=1)
+    flat = master_flat(256, 256, n_frames=20, seed=1)
+'''
+import numpy
+import numpy.random
+
+from fakegrism.cache import cached_array
+from fakegrism.dark import iter_dark_frames
+from fakegrism.noise import NoiseModel
+
+CALIB_VERSION = 1
+
+
+def build_master_dark(nx, ny, n_frames, read_noise, dark_current, seed, chunk=64):
+    ''' Mean of the n_frames dark frames dark_frames() would give for the same
+    seed, accumulated chunk frames at a time. '''
+    total = numpy.zeros([ny, nx])
+    for frames in iter_dark_frames(n_frames, nx, ny, read_noise, seed, numpy.float64, dark_current, chunk):
+        total += frames.sum(axis=0)
+    return (total/n_frames).astype(numpy.float32)
+
+
+def build_master_flat(nx, ny, n_frames, level, prnu, read_noise, dark_current, seed, chunk=64):
+    ''' Normalized (median 1) mean of n_frames flat frames of a detector whose
+    pixels respond with a relative scatter of prnu, illuminated at level
+    counts per pixel.  The mean noise level is subtracted before normalizing. '''
+    response_seed, frame_seed = numpy.random.SeedSequence(seed).spawn(2)
+    response = 1.0 + prnu*numpy.random.default_rng(response_seed).standard_normal((ny, nx))
+    rng = numpy.random.default_rng(frame_seed)
+    noise = NoiseModel(frame_seed, read_noise, dark_current)
+    total = numpy.zeros([ny, nx])
+    for start in range(0, n_frames, chunk):
+        n = min(chunk, n_frames-start)
+        total += (rng.poisson(lam=level*numpy.clip(response, 0.0, None), size=(n, ny, nx)) +
+                  noise.pixel_noise(n, ny, nx)).sum(axis=0)
+    flat = total/n_frames - (read_noise+dark_current)
+    return (flat/numpy.median(flat)).astype(numpy.float32)
+
+
+def master_dark(nx=256, ny=256, n_frames=16, read_noise=50, dark_current=0.0, seed=0, path=None):
+    ''' The master dark for a detector configuration, from the cache if it is
+    there.  seed must be given (not None) for the result to be reusable. '''
+    if seed is None:
+        raise ValueError('cached calibration frames need a seed')
+    params = dict(version=CALIB_VERSION, nx=nx, ny=ny, n_frames=n_frames, read_noise=read_noise,
+                  dark_current=dark_current, seed=seed)
+    build = lambda: build_master_dark(nx, ny, n_frames, read_noise, dark_current, seed)
+    return cached_array('master_dark', params, build, path)
+
+
+def master_flat(nx=256, ny=256, n_frames=16, level=10000.0, prnu=0.02, read_noise=50, dark_current=0.0,
+                seed=0, path=None):
+    ''' The master flat for a detector configuration, from the cache if it is
+    there.  seed must be given (not None) for the result to be reusable. '''
+    if seed is None:
+        raise ValueError('cached calibration frames need a seed')
+    params = dict(version=CALIB_VERSION, nx=nx, ny=ny, n_frames=n_frames, level=level, prnu=prnu,
+                  read_noise=read_noise, dark_current=dark_current, seed=seed)
+    build = lambda: build_master_flat(nx, ny, n_frames, level, prnu, read_noise, dark_current, seed)
+    return cached_array('master_flat', params, build, path)
@@ -0,0 +1,201 @@
+''' Resumable parameter sweeps ("campaigns") of synthetic datasets.
+
+A campaign is described by a JSON spec:
+
+    {
+        "output": "campaign_g1",
+        "base": {"preset": "G1", "n_frames": 8},
+        "sweep": {
+            "preset": ["G1", "G1xG2"],
+            "slit_y": [15, 30],
+            "source_position": [[0.25, 0.75], [0.4, 0.6]],
+            "source_flux": [100.0, 500.0],
+            "seed": [1, 2, 3]
+        }
+    }
+
+Every combination of the sweep values (any generate() config keys; the
+signal to noise is set by source_flux against read_noise and sky_scale) is
+one dataset: base, updated with the combination, is its config.  A dataset
+is stored in the output directory under the hash of everything in its
+merged config that affects the data, as <hash>.fits (the frames),
+<hash>.truth.npy (the input spectrum) and, written last, <hash>.json (its
+config).  A dataset whose .json exists is complete and is never made again,
+so a sweep that was interrupted picks up where it stopped, and a sweep
+grown by a value or an axis only makes the new datasets.  For that, a
+dataset has to be made the same way every time: one whose config leaves
+the seed unset gets a seed derived from the hash of its config.
+manifest.json lists every dataset of the sweep once it has run.
+
+Datasets made in a pool of workers are each made in one process (their
+processes setting is ignored there): pool workers cannot start pools of
+their own.
+
+    python -m fakegrism.campaign sweep.json -j 4
+'''
+import argparse
+import datetime
+import itertools
+import json
+import multiprocessing
+import os
+import sys
+
+from fakegrism.cache import param_hash
+from fakegrism.pipeline import DEFAULTS, PRESETS, make_config, generate
+
+# config keys that do not change the data of a dataset
+IGNORED_KEYS = ('data_file', 'truth_file', 'processes', 'noise_chunk')
+
+
+def sweep_points(sweep):
+    ''' Every combination of the values in sweep (a dict of key: list of
+    values), as dicts, in a fixed order. '''
+    keys = sorted(sweep)
+    return [dict(zip(keys, values)) for values in itertools.product(*[sweep[key] for key in keys])]
+
+
+def dataset_key(config):
+    ''' Hash of the parts of a merged config that affect the data. '''
+    return param_hash('dataset', dict((key, value) for key, value in config.items() if key not in IGNORED_KEYS))
+
+
+def dataset_seed(config):
+    ''' A seed for a merged config that does not set one, from its key. '''
+    return int(dataset_key(config)[:8], 16)
+
+
+def partial_name(filename):
+    ''' Where filename is written until it is complete. '''
+    root, ext = os.path.splitext(filename)
+    return root + '.part' + ext
+
+
+def make_dataset(task):
+    ''' Makes one dataset (see Campaign.tasks), writing each file under a
+    temporary name first, and returns its key.  In a pool worker, the
+    dataset is made in that one process. '''
+    key, point, config, paths = task
+    if multiprocessing.current_process().daemon:
+        config = dict(config, processes=1)
+    partial = dict((name, partial_name(path)) for name, path in paths.items())
+    generate(config, data_file=partial['data'], truth_file=partial['truth'])
+    os.rename(partial['data'], paths['data'])
+    os.rename(partial['truth'], paths['truth'])
+    record = {
+        'key': key,
+        'point': point,
+        'config': dict((k, v) for k, v in config.items() if k not in IGNORED_KEYS),
+        'data_file': os.path.basename(paths['data']),
+        'truth_file': os.path.basename(paths['truth']),
+        'date': datetime.datetime.now().isoformat(),
+    }
+    with open(partial['record'], 'w') as file:
+        json.dump(record, file, indent=1, sort_keys=True)
+    os.rename(partial['record'], paths['record'])
+    return key
+
+
+class Campaign( object ):
+    ''' The datasets of a sweep spec (see the module docstring) and which of
+    them are already on disk. '''
+    def __init__(self, spec, output=None):
+        self.base = dict(spec.get('base', {}))
+        self.sweep = dict(spec.get('sweep', {}))
+        self.output = output or spec.get('output')
+        if not self.output:
+            raise ValueError('a campaign needs an output directory')
+        for key in list(self.base) + list(self.sweep):
+            if key not in DEFAULTS and key != 'preset':
+                raise ValueError('unknown config key in campaign: %r' % (key,))
+        for preset in self.sweep.get('preset', []) + [self.base.get('preset')]:
+            if preset is not None and preset not in PRESETS:
+                raise ValueError('unknown preset: %r' % (preset,))
+
+    def paths(self, key):
+        root = os.path.join(self.output, key[:16])
+        return {'data': root + '.fits', 'record': root + '.json', 'truth': root + '.truth.npy'}
+
+    def tasks(self):
+        ''' (key, point, config, paths) for every dataset of the sweep, with
+        the seed of any config that leaves it unset set by dataset_seed. '''
+        tasks = []
+        for point in sweep_points(self.sweep):
+            config = make_config(self.base, **point)
+            if config['seed'] is None:
+                config['seed'] = dataset_seed(config)
+            key = dataset_key(config)
+            tasks.append((key, point, config, self.paths(key)))
+        return tasks
+
+    def pending(self):
+        ''' The tasks whose datasets are not complete on disk. '''
+        return [task for task in self.tasks() if not os.path.exists(task[3]['record'])]
+
+    def run(self, workers=1, progress=None):
+        ''' Makes every pending dataset, over workers processes (None for one
+        per core), then writes the manifest.  progress, if given, is called as
+        progress(i, n, key) as each dataset is finished.  Returns the number
+        of datasets made. '''
+        if not os.path.isdir(self.output):
+            os.makedirs(self.output)
+        pending = self.pending()
+        if workers == 1 or len(pending) < 2:
+            done = map(make_dataset, pending)
+            pool = None
+        else:
+            pool = multiprocessing.Pool(workers)
+            done = pool.imap_unordered(make_dataset, pending)
+        try:
+            for i, key in enumerate(done):
+                if progress is not None:
+                    progress(i+1, len(pending), key)
+        finally:
+            if pool is not None:
+                pool.terminate()
+                pool.join()
+        self.write_manifest()
+        return len(pending)
+
+    def write_manifest(self):
+        ''' Writes manifest.json: the record of every complete dataset of the
+        sweep, in sweep order. '''
+        records = []
+        for key, point, config, paths in self.tasks():
+            if os.path.exists(paths['record']):
+                with open(paths['record']) as file:
+                    records.append(json.load(file))
+        with open(os.path.join(self.output, 'manifest.json'), 'w') as file:
+            json.dump({'base': self.base, 'sweep': self.sweep, 'datasets': records}, file, indent=1, sort_keys=True)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='python -m fakegrism.campaign',
+                                     description='Runs (or resumes) a sweep of synthetic datasets.')
+    parser.add_argument('spec', help='JSON sweep spec')
+    parser.add_argument('-o', '--output', help='output directory (overrides the spec)')
+    parser.add_argument('-j', '--workers', type=int, default=1, help='worker processes (0 for one per core)')
+    parser.add_argument('-n', '--dry-run', action='store_true', help='only report what is done and what is not')
+    parser.add_argument('-q', '--quiet', action='store_true', help='do not report progress')
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    with open(args.spec) as file:
+        campaign = Campaign(json.load(file), args.output)
+    n_total = len(campaign.tasks())
+    n_pending = len(campaign.pending())
+    if not args.quiet or args.dry_run:
+        print('%s: %d datasets, %d done, %d to make' % (campaign.output, n_total, n_total-n_pending, n_pending))
+    if args.dry_run:
+        return 0
+    def progress(i, n, key):
+        if not args.quiet:
+            print('%d/%d %s' % (i, n, campaign.paths(key)['data']))
+    campaign.run(args.workers or None, progress)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,113 @@
+''' Headless command line front end to fakegrism.generate().
+
+    python -m fakegrism G1xG2 -o g1xg2_fake_data.fits -t g1xg2_input.txt --seed 1
+    python -m fakegrism G1 --count 100 -o 'g1_{index:03d}.fits' --seed 1000 -j 0
+'''
+import argparse
+import json
+import os
+import sys
+
+from fakegrism import instrument
+from fakegrism.pipeline import PRESETS, DEFAULTS, generate
+
+
+def parse_value(text):
+    ''' JSON if it parses (numbers, lists, null...), the bare string otherwise. '''
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+
+def batch_name(pattern, index, count):
+    ''' File name for dataset index of a batch.  Patterns containing {index}
+    are formatted; otherwise _NNN is added before the extension when there is
+    more than one dataset. '''
+    if (pattern is None) or (count == 1 and '{index' not in pattern):
+        return pattern
+    if '{index' in pattern:
+        return pattern.format(index=index)
+    root, ext = os.path.splitext(pattern)
+    return '%s_%03d%s' % (root, index, ext)
+
+
+def progress_report(name, stream=None):
+    ''' A generate() progress callback that keeps a "name: frame i/n" line
+    up to date on stream (default: stderr). '''
+    stream = stream or sys.stderr
+    def progress(i, n):
+        stream.write('\r%s: frame %d/%d' % (name, i, n))
+        stream.flush()
+    return progress
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='fakegrism', description='Generates synthetic FORCAST grism data.')
+    parser.add_argument('preset', nargs='?', default=None, choices=sorted(PRESETS),
+                        help='instrument setup to start from')
+    parser.add_argument('-c', '--config', help='JSON file of config values')
+    parser.add_argument('-s', '--set', action='append', default=[], metavar='KEY=VALUE',
+                        help='override a config value (VALUE is parsed as JSON); may be repeated')
+    parser.add_argument('-o', '--output', help='FITS file for the frames')
+    parser.add_argument('-t', '--truth', help='file for the truth spectrum (.npy, .fits or text, by extension)')
+    parser.add_argument('-n', '--frames', type=int, help='number of nod frames')
+    parser.add_argument('--seed', type=int, help='random seed (dataset i of a batch uses seed+i)')
+    parser.add_argument('-j', '--processes', type=int,
+                        help='worker processes (0 for one per core)')
+    parser.add_argument('--count', type=int, default=1, help='number of datasets to generate')
+    parser.add_argument('-q', '--quiet', action='store_true', help='do not report progress')
+    parser.add_argument('--profile', action='store_true',
+                        help='time each stage of generation and print a summary at the end')
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    config = {}
+    if args.config:
+        with open(args.config) as file:
+            config.update(json.load(file))
+    if args.preset:
+        config['preset'] = args.preset
+    for item in args.set:
+        key, sep, value = item.partition('=')
+        if not sep or key not in DEFAULTS:
+            sys.stderr.write('fakegrism: bad --set %r\n' % (item,))
+            return 2
+        config[key] = parse_value(value)
+    if args.frames is not None:
+        config['n_frames'] = args.frames
+    if args.processes is not None:
+        config['processes'] = args.processes or None
+
+    profiler = instrument.enable() if args.profile else None
+
+    data_file = args.output or config.get('data_file')
+    truth_file = args.truth or config.get('truth_file')
+    seed = args.seed if args.seed is not None else config.get('seed')
+    for index in range(args.count):
+        config['seed'] = None if seed is None else seed+index
+        config['data_file'] = batch_name(data_file, index, args.count)
+        config['truth_file'] = batch_name(truth_file, index, args.count)
+        name = config['data_file'] or '(not written)'
+        try:
+            result = generate(config, progress=None if args.quiet else progress_report(name))
+        except ValueError as error:
+            if profiler is not None:
+                instrument.disable()
+            sys.stderr.write('fakegrism: %s\n' % (error,))
+            return 2
+        if not args.quiet:
+            frames = result['frames']
+            sys.stderr.write('\n')
+            print('%s: %d frames, min %g, max %g' % (name, len(frames), frames.min(), frames.max()))
+    if profiler is not None:
+        instrument.disable()
+        sys.stderr.write(profiler.report() + '\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,76 @@
+''' FFT convolution of slit illumination with the PSF.
+
+The sky seen through a slit is a map of weights, one per pixel-sized slit
+element, convolved with the image of a single element: the PSF averaged
+over the element and over a detector pixel.  That element kernel is built
+once per slit geometry and PSF.  The PSF is sampled oversample times finer
+than the pixels, and a single FFT convolution with the (triangular)
+autocorrelation of a pixel-sized box does the averaging.  The kernel is then
+decimated back to detector pixels.  After that, each sky image is one
+batched FFT convolution of the weight maps with the kernel, so the time per
+frame does not depend on the oversampling factor.
+'''
+import numpy
+import scipy.fft
+from scipy.signal import fftconvolve
+
+
+def box_autocorrelation(oversample):
+    ''' Weights of the 2*oversample-1 differences between oversample
+    sub-positions of one pixel and oversample of another (they sum to 1). '''
+    return (oversample - numpy.abs(numpy.arange(1-oversample, oversample)))/float(oversample**2)
+
+
+def fine_grid(x, oversample):
+    ''' Centers of the oversample sub-pixels of each pixel centered on x. '''
+    sub = (numpy.arange(oversample)+0.5)/oversample - 0.5
+    return (numpy.asarray(x, dtype=float)[:, numpy.newaxis] + sub).ravel()
+
+
+def binned_psf(psf, x, y, x_c, y_c, oversample=1):
+    ''' psf(X, Y, x_c, y_c) averaged over each pixel of the grid x, y, from
+    oversample x oversample samples per pixel. '''
+    if oversample == 1:
+        X, Y = numpy.meshgrid(x, y)
+        return psf(X, Y, x_c, y_c)
+    X, Y = numpy.meshgrid(fine_grid(x, oversample), fine_grid(y, oversample))
+    fine = psf(X, Y, x_c, y_c)
+    return fine.reshape(len(y), oversample, len(x), oversample).mean(axis=(1, 3))
+
+
+def element_kernel(psf, dx, dy, oversample=1):
+    ''' Image of a pixel-sized slit element, averaged over detector pixels, at
+    the (unit spaced) offsets dx, dy of pixel centers from the element
+    center.  psf(X, Y, x_c, y_c) draws the PSF. '''
+    if oversample == 1:
+        X, Y = numpy.meshgrid(dx, dy)
+        return psf(X, Y, 0.0, 0.0)
+    #the PSF on a grid oversample times finer, reaching oversample-1 fine
+    #steps beyond dx and dy, averaged over all pairs of sub-positions
+    fx = dx[0] + numpy.arange(1-oversample, oversample*len(dx))/float(oversample)
+    fy = dy[0] + numpy.arange(1-oversample, oversample*len(dy))/float(oversample)
+    X, Y = numpy.meshgrid(fx, fy)
+    weights = box_autocorrelation(oversample)
+    smooth = fftconvolve(psf(X, Y, 0.0, 0.0), numpy.outer(weights, weights), mode='valid')
+    return smooth[::oversample, ::oversample]
+
+
+class SkyConvolver( object ):
+    ''' Sky images of an (ny, nx) stamp lit by an n_x x n_y grid of slit
+    elements.  kernel is the element kernel at the offsets of every stamp
+    pixel from every element, (ny+n_y-1, nx+n_x-1) with the largest negative
+    offsets first. '''
+    def __init__(self, kernel, n_x, n_y):
+        self.n_x = n_x
+        self.n_y = n_y
+        self.shape = (kernel.shape[0]-n_y+1, kernel.shape[1]-n_x+1)
+        self.fft_shape = tuple(scipy.fft.next_fast_len(n, real=True)
+                               for n in (kernel.shape[0]+n_y-1, kernel.shape[1]+n_x-1))
+        self.kernel_fft = scipy.fft.rfft2(kernel, self.fft_shape)
+
+    def sky(self, weights):
+        ''' Sky images for a (n, n_x*n_y) stack of element weights, ordered x
+        (outer) then y, as the slit kernels are. '''
+        maps = numpy.asarray(weights).reshape(-1, self.n_x, self.n_y).transpose(0, 2, 1)
+        full = scipy.fft.irfft2(scipy.fft.rfft2(maps, self.fft_shape)*self.kernel_fft, self.fft_shape)
+        return full[:, self.n_y-1:self.n_y-1+self.shape[0], self.n_x-1:self.n_x-1+self.shape[1]]
@@ -0,0 +1,18 @@
+import numpy
+
+from fakegrism.noise import NoiseModel
+
+
+def iter_dark_frames(n_frames, nx=256, ny=256, read_noise=50, seed=None, dtype=numpy.int32, dark_current=0.0, chunk=64):
+    ''' Yields chunks of up to chunk dark frames (read noise plus dark
+    current); the frames do not depend on the chunk size. '''
+    noise = NoiseModel(seed, read_noise, dark_current)
+    for start in range(0, n_frames, chunk):
+        yield noise.pixel_noise(min(chunk, n_frames-start), ny, nx, dtype)
+
+
+def dark_frames(n_frames, nx=256, ny=256, read_noise=50, seed=None, dtype=numpy.int32, dark_current=0.0):
+    ''' n_frames dark frames of Poisson read noise with mean read_noise, plus
+    dark current. '''
+    noise = NoiseModel(seed, read_noise, dark_current)
+    return noise.pixel_noise(n_frames, ny, nx, dtype)
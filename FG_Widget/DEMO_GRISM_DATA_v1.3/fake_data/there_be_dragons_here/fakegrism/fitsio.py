@@ -0,0 +1,112 @@
+import numpy
+
+try:
+    from astropy.io import fits as pyfits
+except ImportError:
+    import pyfits
+
+BLOCK = 2880    # FITS files are written in blocks of this many bytes
+
+BITPIX = {
+    numpy.dtype(numpy.uint8): 8,
+    numpy.dtype(numpy.int16): 16,
+    numpy.dtype(numpy.int32): 32,
+    numpy.dtype(numpy.int64): 64,
+    numpy.dtype(numpy.float32): -32,
+    numpy.dtype(numpy.float64): -64,
+}
+
+
+def convert(data, dtype):
+    ''' data as dtype.  Conversion to an integer type rounds to the nearest
+    integer, and raises ValueError rather than wrap values out of its range. '''
+    dtype = numpy.dtype(dtype)
+    data = numpy.asarray(data)
+    if dtype.kind in 'iu' and data.dtype.kind == 'f':
+        data = numpy.rint(data)
+        info = numpy.iinfo(dtype)
+        if data.size and ((data.min() < info.min) or (data.max() > info.max)):
+            raise ValueError('values %g to %g do not fit in %s' % (data.min(), data.max(), dtype))
+    return data.astype(dtype, copy=False)
+
+
+def write_cube(filename, data):
+    ''' Writes data as the primary HDU of filename, replacing any existing file. '''
+    hdu = pyfits.PrimaryHDU(data)
+    try:
+        hdu.writeto(filename, overwrite=True)
+    except TypeError:
+        hdu.writeto(filename, clobber=True)
+
+
+class CubeWriter( object ):
+    ''' Streams frames into an (n_frames, ny, nx) primary HDU on disk.
+
+    The header and the full data section are laid out when the writer is
+    created; the data section is then memory mapped, so each frame costs a
+    single write into place and nothing but the current frame is held in
+    memory.
+
+        with CubeWriter('nod_data.fits', n_frames, 256, 256) as writer:
+            for frame in frames:
+                writer.write(frame)
+    '''
+    def __init__(self, filename, n_frames, ny, nx, dtype=numpy.float64, header=None):
+        self.filename = filename
+        self.dtype = numpy.dtype(dtype)
+        if self.dtype not in BITPIX:
+            raise ValueError('no FITS BITPIX for dtype %s' % (self.dtype,))
+        self.shape = (n_frames, ny, nx)
+
+        cards = pyfits.Header()
+        cards['SIMPLE'] = True
+        cards['BITPIX'] = BITPIX[self.dtype]
+        cards['NAXIS'] = 3
+        cards['NAXIS1'] = nx
+        cards['NAXIS2'] = ny
+        cards['NAXIS3'] = n_frames
+        cards['EXTEND'] = True
+        if header is not None:
+            for card in header.cards:
+                if card.keyword not in cards:
+                    cards.append(card)
+        header_bytes = cards.tostring().encode('ascii')
+
+        data_size = n_frames*ny*nx*self.dtype.itemsize
+        with open(filename, 'wb') as file:
+            file.write(header_bytes)
+            file.truncate(len(header_bytes) + -(-data_size//BLOCK)*BLOCK)
+        self.data = numpy.memmap(filename, dtype=self.dtype.newbyteorder('>'), mode='r+',
+                                 offset=len(header_bytes), shape=self.shape)
+        self.n_written = 0
+
+    def __setitem__(self, index, frame):
+        self.data[index] = convert(frame, self.dtype)
+
+    def write(self, frame):
+        ''' Writes frame into the next free plane of the cube. '''
+        if self.n_written >= self.shape[0]:
+            raise IndexError('cube already holds %d frames' % self.shape[0])
+        self.data[self.n_written] = convert(frame, self.dtype)
+        self.n_written += 1
+
+    def write_tile(self, index, row, tile):
+        ''' Writes tile into frame index of the cube, starting at row. '''
+        self.data[index, row:row+len(tile)] = convert(tile, self.dtype)
+
+    def close(self):
+        if self.data is not None:
+            self.data.flush()
+            self.data = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+def read_cube(filename):
+    ''' Memory maps the primary HDU of filename. '''
+    return pyfits.getdata(filename, memmap=True)
@@ -0,0 +1,339 @@
+''' Frame generation, optionally spread over a process pool.
+
+Every order of every nod frame (or, for tiles, every block of columns of
+one) is an independent task.  All random numbers
+(read noise, dark current and sky weights) are drawn up front in this
+process from a NoiseModel seeded once, so that the frames do not depend on
+how (or whether) the tasks are distributed over worker processes: a parallel
+run is bit-identical to a serial run with the same seed.
+
+The slit images of an order are made COLUMN_BLOCK columns at a time, the
+blocks starting at multiples of COLUMN_BLOCK, both for whole frames and
+for tiles (see iter_tiles), which make only the blocks a band needs: a
+block then comes out the same either way.
+'''
+import collections
+import copy
+import multiprocessing
+import numpy
+import numpy.random
+
+from fakegrism import instrument
+from fakegrism.render import (order_trace, stamp_offsets, subpixel_offsets, place_stamps, render_box, add_box,
+                              add_clipped_stamps)
+from fakegrism.fitsio import convert
+from fakegrism.noise import NoiseModel
+
+COLUMN_BLOCK = 32   # columns of an order whose slit images are made together
+
+
+def slit_list(slit, orders):
+    ''' slit, a Slit for every order or a list of one per order (whose
+    PSFs may differ, but whose geometry and dtype must not), as a list. '''
+    if isinstance(slit, (list, tuple)):
+        if len(slit) != len(orders):
+            raise ValueError('%d slits for %d orders' % (len(slit), len(orders)))
+        return list(slit)
+    return [slit]*len(orders)
+
+
+def order_flux(scene, position, k, flux):
+    ''' (flux, positions) of order k for a task: the spectrum of the point
+    source (and no positions) or, with a scene, its flux at each of its
+    positions along the slit. '''
+    if scene is None:
+        return flux, None
+    positions, flux = scene.order_flux(position, k)
+    return flux, positions
+
+
+def padded_grid(slit, nx=256, ny=256):
+    ''' Axes of the detector plane, padded by half a slit image on every side
+    so that stamps centered on the edge of the detector fit. '''
+    xdim = slit.width*slit.width_mult+1.0
+    ydim = slit.length*slit.length_mult+1.0
+    neg_x = numpy.floor(xdim/2.0)
+    pos_x = numpy.floor(xdim/2.0)+numpy.round(xdim % 2)
+    neg_y = numpy.floor(ydim/2.0)
+    pos_y = numpy.floor(ydim/2.0)+numpy.round(ydim % 2)
+    x = numpy.arange(-neg_x, nx+pos_x, 1.0)
+    y = numpy.arange(-neg_y, ny+pos_y, 1.0)
+    return x, y
+
+
+def profiled(profile, func, *args):
+    ''' (func(*args), stats): when profile is set, stats is the summary of a
+    profiler that timed just this call (wherever it ran); otherwise it is
+    None. '''
+    if not profile:
+        return func(*args), None
+    outer = instrument.disable()
+    profiler = instrument.enable()
+    try:
+        result = func(*args)
+    finally:
+        instrument.disable()
+        if outer is not None:
+            instrument.enable(outer)
+    return result, profiler.summary()
+
+
+def column_images(slit, position, flux, weights, positions=None):
+    ''' The slit images (see Slit.slit_images) of the source at position and
+    the sky weights of each column, COLUMN_BLOCK columns at a time: the sums
+    in the matrix products behind the images may otherwise depend on how
+    many columns are made together. '''
+    slit = copy.copy(slit)
+    slit.point_source(position)
+    instrument.count('columns', len(weights))
+    with instrument.stage('slit_images'):
+        return numpy.concatenate([slit.slit_images(flux[lo:lo+COLUMN_BLOCK], weights=weights[lo:lo+COLUMN_BLOCK],
+                                                   positions=positions)
+                                  for lo in range(0, len(weights), COLUMN_BLOCK)])
+
+
+def render_image(slit, position, order, flux, positions, weights, subpixel):
+    xrange, y_c = order_trace(order[0], order[1], order[2], order[3], slit.length/2.0)
+    stamps = column_images(slit, position, flux, weights, positions)
+    with instrument.stage('render'):
+        return render_box(stamps, xrange, y_c, subpixel, dtype=slit.dtype)
+
+
+def order_image(args):
+    ''' (row, col, box, stats): the image of a single order for one nod
+    position, in the smallest box around it, and the detector pixel its
+    first pixel belongs at (see render_box); stats is as for profiled.  For
+    a scene, flux is the flux of every column at each of the scene's
+    positions (see Scene.order_flux). '''
+    slit, (nx, ny), position, order, flux, positions, weights, subpixel, profile = args
+    (row, col, box), stats = profiled(profile, render_image, slit, position, order, flux, positions, weights, subpixel)
+    return row, col, box, stats
+
+
+def place_block(slit, position, flux, positions, weights, x_c, y_c, subpixel):
+    stamps = column_images(slit, position, flux, weights, positions)
+    with instrument.stage('render'):
+        return place_stamps(0, 0, stamps, x_c, y_c, subpixel)
+
+
+def block_image(args):
+    ''' (stamps, rows, cols, stats): the slit images of one block of columns
+    of an order, for one nod position, placed on the columns x_c at the
+    rows y_c of its trace (see place_stamps); stats is as for profiled. '''
+    slit, position, flux, positions, weights, x_c, y_c, subpixel, profile = args
+    (stamps, rows, cols), stats = profiled(profile, place_block, slit, position, flux, positions, weights,
+                                           x_c, y_c, subpixel)
+    return stamps, rows, cols, stats
+
+
+def order_blocks(slit, orders, subpixel):
+    ''' For each order, (x_c, y_c, extents): its columns and trace (see
+    order_trace), and the detector rows [lo, hi) that the placed stamps of
+    each block of COLUMN_BLOCK columns can reach. '''
+    xdim = slit.width*slit.width_mult+1
+    ydim = slit.length*slit.length_mult+1
+    result = []
+    for x_right, x_left, y_right, y_left in orders:
+        x_c, y_c = order_trace(x_right, x_left, y_right, y_left, slit.length/2.0)
+        if subpixel:
+            #a stamp shifted by a fraction of a pixel grows by one row
+            rows = subpixel_offsets(x_c, y_c, xdim, ydim, 0, 0)[0]
+            height = ydim+1
+        else:
+            rows = stamp_offsets(x_c, y_c, xdim, ydim, 0, 0)[0]
+            height = ydim
+        extents = [(rows[lo:lo+COLUMN_BLOCK].min(), rows[lo:lo+COLUMN_BLOCK].max()+height)
+                   for lo in range(0, len(x_c), COLUMN_BLOCK)]
+        result.append((x_c, y_c, extents))
+    return result
+
+
+def bounded_map(pool, func, tasks, lookahead):
+    ''' Yields func(task) for each of tasks in turn, over pool if there is
+    one, with no more than lookahead tasks sent to it ahead of the result
+    being taken, so that neither tasks nor results pile up. '''
+    if pool is None:
+        for task in tasks:
+            yield func(task)
+        return
+    pending = collections.deque()
+    for task in tasks:
+        pending.append(pool.apply_async(func, (task,)))
+        if len(pending) >= lookahead:
+            yield pending.popleft().get()
+    while pending:
+        yield pending.popleft().get()
+
+
+def check_chunk(chunk):
+    if chunk is not None and int(chunk) < 1:
+        raise ValueError('chunk must be at least one frame, not %r' % (chunk,))
+
+
+def iter_frames(slit, source_position, orders, spectrum, seed=None, nx=256, ny=256,
+                read_noise=50, processes=1, dark_current=0.0, chunk=16, subpixel=True, scene=None):
+    ''' Yields the (ny, nx) detector frames of generate_frames one at a time.
+    Frames are accumulated in slit.dtype, and are made chunk frames at a
+    time: the noise for a chunk is drawn in bulk (see fakegrism.noise) and its
+    orders rendered, over the pool if there is one, before the next chunk is
+    started, so memory is bounded by the chunk size (None for all the frames
+    at once; anything less than one frame is a ValueError).  slit may be a
+    list of one Slit per order (see slit_list).  With a scene (a
+    fakegrism.scene.Scene), its sources replace the single point source;
+    spectrum then only gives the number of columns of each order. '''
+    check_chunk(chunk)
+    orders = list(orders)
+    spectrum = list(spectrum)
+    slits = slit_list(slit, orders)
+    slit = slits[0]
+    n_frames = len(source_position)
+    n_positions = slit.n_positions()
+    shapes = [(len(flux), n_positions) for flux in spectrum]
+    noise = NoiseModel(seed, read_noise, dark_current)
+    profiler = instrument.active()
+
+    pool = None
+    if processes != 1:
+        pool = multiprocessing.Pool(processes)
+    try:
+        start = 0
+        chunks = noise.chunks(n_frames, chunk, ny, nx, shapes, slit.dtype)
+        while True:
+            with instrument.stage('noise'):
+                pixel_noise, sky_weights = next(chunks, (None, None))
+            if pixel_noise is None:
+                break
+            positions = source_position[start:start+len(pixel_noise)]
+            start += len(pixel_noise)
+            tasks = [(slits[k], (nx, ny), position, tuple(order)) + order_flux(scene, position, k, flux)
+                     + (weights[k], subpixel, profiler is not None)
+                     for position, weights in zip(positions, sky_weights)
+                     for k, (order, flux) in enumerate(zip(orders, spectrum))]
+            if pool is None:
+                images = map(order_image, tasks)
+            else:
+                images = pool.imap(order_image, tasks)
+
+            #sums each frame in a fixed order, whichever process rendered the pieces
+            for frame in pixel_noise:
+                for k in range(len(orders)):
+                    #'orders' is the wall time spent waiting for the orders
+                    #here; the stages inside them are timed where they ran
+                    with instrument.stage('orders'):
+                        row, col, box, stats = next(images)
+                    with instrument.stage('add_box'):
+                        add_box(frame, row, col, box)
+                    if stats is not None:
+                        profiler.merge(stats)
+                instrument.count('frames')
+                yield frame
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+
+
+def iter_tiles(slit, source_position, orders, spectrum, seed=None, nx=256, ny=256,
+               read_noise=50, processes=1, dark_current=0.0, chunk=16, subpixel=True, tile_rows=256,
+               scene=None):
+    ''' Yields the frames of iter_frames as (frame, row, tile): frame index,
+    first detector row, and a (tile_rows, nx) band of that frame (the last
+    band of a frame may be shorter), every band of a frame in turn.  The
+    bands are bit-identical to those of iter_frames whatever tile_rows is.
+
+    Each band is rendered on its own from the blocks of COLUMN_BLOCK
+    columns whose stamps reach it, with a pool sent only a few blocks
+    ahead, so memory holds a band and a few blocks rather than whole
+    orders, at the cost of making again a block that reaches several
+    bands.  slit and scene are as for iter_frames. '''
+    check_chunk(chunk)
+    orders = list(orders)
+    spectrum = list(spectrum)
+    slits = slit_list(slit, orders)
+    slit = slits[0]
+    n_frames = len(source_position)
+    chunk = int(chunk or n_frames)
+    tile_rows = max(1, min(int(tile_rows), ny))
+    n_positions = slit.n_positions()
+    shapes = [(len(flux), n_positions) for flux in spectrum]
+    noise = NoiseModel(seed, read_noise, dark_current)
+    profiler = instrument.active()
+
+    #the blocks of each order whose stamps reach each band, the same for every frame
+    blocks = order_blocks(slit, orders, subpixel)
+    bands = [(row, min(tile_rows, ny-row)) for row in range(0, ny, tile_rows)]
+    crossing = [[[b for b, (lo, hi) in enumerate(extents) if (lo < row+n_rows) and (hi > row)]
+                 for x_c, y_c, extents in blocks] for row, n_rows in bands]
+
+    def tasks():
+        for start in range(0, n_frames, chunk):
+            positions = source_position[start:start+chunk]
+            with instrument.stage('noise'):
+                sky_weights = noise.sky_weights(len(positions), shapes, slit.dtype)
+            for position, weights in zip(positions, sky_weights):
+                fluxes = [order_flux(scene, position, k, flux) for k, flux in enumerate(spectrum)]
+                for band in crossing:
+                    for k, order_blocks_k in enumerate(band):
+                        x_c, y_c = blocks[k][:2]
+                        flux, scene_positions = fluxes[k]
+                        for b in order_blocks_k:
+                            columns = slice(b*COLUMN_BLOCK, (b+1)*COLUMN_BLOCK)
+                            yield (slits[k], position, flux[columns], scene_positions, weights[k][columns],
+                                   x_c[columns], y_c[columns], subpixel, profiler is not None)
+
+    pool = None
+    if processes != 1:
+        pool = multiprocessing.Pool(processes)
+    try:
+        lookahead = 2*(processes or multiprocessing.cpu_count())
+        images = bounded_map(pool, block_image, tasks(), lookahead)
+        for i in range(n_frames):
+            for (row, n_rows), band in zip(bands, crossing):
+                with instrument.stage('noise'):
+                    tile = noise.pixel_noise(1, n_rows, nx, slit.dtype)[0]
+                for (x_c, y_c, extents), order_blocks_k in zip(blocks, band):
+                    if not order_blocks_k:
+                        continue
+                    #the order's stamps are summed at float64, as render_box sums them,
+                    #over the rows of the band they reach
+                    lo = max(row, min(extents[b][0] for b in order_blocks_k))
+                    hi = min(row+n_rows, max(extents[b][1] for b in order_blocks_k))
+                    image = numpy.zeros((hi-lo, nx))
+                    for b in order_blocks_k:
+                        with instrument.stage('orders'):
+                            stamps, rows, cols, stats = next(images)
+                        if stats is not None:
+                            profiler.merge(stats)
+                        with instrument.stage('add_box'):
+                            add_clipped_stamps(image, stamps, rows-lo, cols)
+                    with instrument.stage('add_box'):
+                        tile[lo-row:hi-row] += image.astype(tile.dtype)
+                instrument.count('tiles')
+                yield i, row, tile
+            instrument.count('frames')
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+
+
+def generate_frames(slit, source_position, orders, spectrum, seed=None, nx=256, ny=256,
+                    read_noise=50, processes=1, dtype=None, dark_current=0.0, chunk=16, subpixel=True,
+                    scene=None):
+    ''' Generates one detector frame per entry in source_position.
+
+    orders is a list of (x_right, x_left, y_right, y_left) endpoints and
+    spectrum the matching list of fluxes, one per column of each order.
+    processes is the number of worker processes (None for one per core, 1 to
+    run everything in this process).  subpixel places the slit images at
+    their exact (fractional) positions along the trace rather than on the
+    pixel grid (see render_order).  slit may be a list of one Slit per order
+    (see slit_list), and a scene may replace the point source (see
+    iter_frames).  Returns an (n_frames, ny, nx) array of dtype
+    (default: that of the slits). '''
+    dtype = numpy.dtype(dtype or slit_list(slit, orders)[0].dtype)
+    frames = numpy.zeros([len(source_position), ny, nx], dtype=dtype)
+    for i, frame in enumerate(iter_frames(slit, source_position, orders, spectrum, seed, nx, ny,
+                                          read_noise, processes, dark_current, chunk, subpixel, scene)):
+        frames[i] = convert(frame, dtype)
+    return frames
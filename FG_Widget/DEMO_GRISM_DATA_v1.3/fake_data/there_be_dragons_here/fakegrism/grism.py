@@ -0,0 +1,124 @@
+import numpy
+
+FOCAL_LENGTH = 1.5748e5   # camera focal length (in microns)
+PIXEL_PITCH = 50.0        # detector pixel size (in microns)
+
+
+class Grism( object ):
+    def __init__(self, name, sigma, delta, n, l_start, l_stop):
+        self.name = name
+        self.sigma = sigma
+        self.delta = delta
+        self.n = n
+        self.l_start = l_start
+        self.l_stop = l_stop
+
+    def calc_beta(self, wl, m):
+        beta = numpy.degrees(numpy.arcsin( m*wl/self.sigma - self.n*numpy.sin(numpy.radians(self.delta)))) + self.delta
+        return beta
+
+    def calc_wl(self, beta, m):
+        ''' Inverse of calc_beta: the wavelength leaving the grism at angle beta
+        (in degrees) in order m. '''
+        return self.sigma*(numpy.sin(numpy.radians(beta - self.delta)) + self.n*numpy.sin(numpy.radians(self.delta)))/m
+
+
+def focal_plane_position(beta, focal_length=FOCAL_LENGTH, pixel_size=PIXEL_PITCH):
+    ''' Position on the detector (in pixels from the optical axis) of light
+    leaving the grism at angle beta (in degrees). '''
+    return numpy.tan(numpy.radians(beta))*focal_length/pixel_size
+
+
+def focal_plane_angle(position, focal_length=FOCAL_LENGTH, pixel_size=PIXEL_PITCH):
+    ''' Inverse of focal_plane_position. '''
+    return numpy.degrees(numpy.arctan(numpy.asarray(position)*pixel_size/focal_length))
+
+
+class TraceModel( object ):
+    ''' Where each order of a grism lands on the detector.
+
+    grism disperses along the dispersion axis; an optional cross-dispersing
+    grism, used in order xdisp_order, separates the orders along the
+    cross-dispersion axis.  Positions are in pixels from the optical axis. '''
+    def __init__(self, grism, xdisp=None, xdisp_order=1.0, focal_length=FOCAL_LENGTH, pixel_size=PIXEL_PITCH):
+        self.grism = grism
+        self.xdisp = xdisp
+        self.xdisp_order = xdisp_order
+        self.focal_length = focal_length
+        self.pixel_size = pixel_size
+
+    def positions(self, orders, wl):
+        ''' (dispersion, cross) positions on an (order, wavelength) grid, all
+        orders in one broadcast pass.  Wavelengths an order cannot reach are
+        NaN. '''
+        m = numpy.asarray(orders, dtype=float).reshape(-1, 1)
+        wl = numpy.asarray(wl, dtype=float).reshape(1, -1)
+        with numpy.errstate(invalid='ignore'):
+            dispersion = focal_plane_position(self.grism.calc_beta(wl, m), self.focal_length, self.pixel_size)
+            if self.xdisp is not None:
+                cross = focal_plane_position(self.xdisp.calc_beta(wl, self.xdisp_order), self.focal_length, self.pixel_size)
+            else:
+                cross = numpy.zeros(wl.shape)
+        return dispersion, numpy.broadcast_to(cross, dispersion.shape)
+
+    def invert(self, dispersion, cross=None, orders=None):
+        ''' (order, wavelength) of detector positions.
+
+        Cross-dispersed, the wavelength seen across the dispersion picks the
+        order (the nearest of orders, when given) out of the m*wl fixed by the
+        dispersion position.  Single-order, orders gives the order. '''
+        with numpy.errstate(invalid='ignore'):
+            m_wl = self.grism.calc_wl(focal_plane_angle(dispersion, self.focal_length, self.pixel_size), 1.0)
+            if self.xdisp is None:
+                if orders is None:
+                    raise ValueError('a single-order trace needs the order')
+                m = numpy.broadcast_to(numpy.asarray(orders, dtype=float), numpy.shape(m_wl))
+                return m, m_wl/m
+            if cross is None:
+                raise ValueError('a cross-dispersed trace needs the cross-dispersion position')
+            wl_x = self.xdisp.calc_wl(focal_plane_angle(cross, self.focal_length, self.pixel_size), self.xdisp_order)
+            if orders is None:
+                m = numpy.rint(m_wl/wl_x)
+            else:
+                candidates = numpy.asarray(orders, dtype=float)
+                misfit = numpy.abs(numpy.asarray(m_wl)[..., numpy.newaxis]/candidates - numpy.asarray(wl_x)[..., numpy.newaxis])
+                m = candidates[numpy.argmin(misfit, axis=-1)]
+        return m, m_wl/m
+
+    def order_endpoints(self, orders, wl, nx=256, ny=256, x0=None, y0=None, y_offset=0.0):
+        ''' Endpoints of each order on an nx x ny detector, in the form of the
+        x_right/x_left/y_right/y_left lists of the generator config.  The
+        dispersion runs along detector X, the optical axis is at (x0, y0)
+        (default: the detector center) and each order is approximated by the
+        straight line between the first and last wavelengths of wl that fall
+        on the detector.  Orders that miss the detector are left out.
+
+        The generator puts the slit center y_offset above y_left/y_right, so
+        pass half the slit length to center the slit on the trace; the result
+        can then be passed straight to generate() as (part of) a config. '''
+        x0 = nx/2.0 if x0 is None else x0
+        y0 = ny/2.0 if y0 is None else y0
+        dispersion, cross = self.positions(orders, wl)
+        x = x0 + dispersion
+        y = y0 + cross
+        on_chip = (x >= 0) & (x < nx) & (y >= 0) & (y < ny)
+        endpoints = {'x_right': [], 'x_left': [], 'y_right': [], 'y_left': [], 'm': []}
+        for m, xo, yo, ok in zip(orders, x, y, on_chip):
+            if not ok.any():
+                continue
+            xo = xo[ok]
+            yo = yo[ok]
+            left = numpy.argmin(xo)
+            right = numpy.argmax(xo)
+            endpoints['x_left'].append(int(numpy.floor(xo[left])))
+            endpoints['x_right'].append(int(numpy.ceil(xo[right])))
+            endpoints['y_left'].append(int(numpy.round(yo[left]-y_offset)))
+            endpoints['y_right'].append(int(numpy.round(yo[right]-y_offset)))
+            endpoints['m'].append(int(m))
+        return endpoints
+
+
+GRISMS = {
+    'G1': Grism('G1', 25.0, 6.16, 3.43, 4.9, 7.8),
+    'G2': Grism('G2', 87.0, 32.6, 3.43, 4.9, 7.8),
+}
@@ -0,0 +1,110 @@
+''' Per-stage timing and counters for the generator.
+
+Stages of frame generation are wrapped in stage('name') blocks and events
+counted with count('name').  Both cost next to nothing until a Profiler is
+enabled:
+
+    profiler = enable()
+    generate(preset='G1xG2', n_frames=100)
+    disable()
+    print(profiler.report())
+
+Orders rendered in worker processes are timed there and the results are
+merged into the profiler of the parent (see fakegrism.frames).
+'''
+import time
+
+
+class Profiler( object ):
+    ''' Total wall time and number of calls of each stage, and the total of
+    each counter. '''
+    def __init__(self):
+        self.times = {}
+        self.calls = {}
+        self.counts = {}
+
+    def add_time(self, name, seconds, calls=1):
+        self.times[name] = self.times.get(name, 0.0) + seconds
+        self.calls[name] = self.calls.get(name, 0) + calls
+
+    def count(self, name, n=1):
+        self.counts[name] = self.counts.get(name, 0) + n
+
+    def summary(self):
+        ''' The times, calls and counts as a plain (picklable, JSON-ready) dict. '''
+        return {'times': dict(self.times), 'calls': dict(self.calls), 'counts': dict(self.counts)}
+
+    def merge(self, summary):
+        ''' Adds in the summary() of another profiler. '''
+        for name, seconds in summary['times'].items():
+            self.add_time(name, seconds, summary['calls'][name])
+        for name, n in summary['counts'].items():
+            self.count(name, n)
+
+    def report(self):
+        ''' The stages, slowest first, and the counters, as text. '''
+        lines = ['%-20s %10s %8s %12s' % ('stage', 'total (s)', 'calls', 'per call (ms)')]
+        for name in sorted(self.times, key=self.times.get, reverse=True):
+            lines.append('%-20s %10.3f %8d %12.3f' % (name, self.times[name], self.calls[name],
+                                                      1e3*self.times[name]/self.calls[name]))
+        for name in sorted(self.counts):
+            lines.append('%-20s %10d' % (name, self.counts[name]))
+        return '\n'.join(lines)
+
+
+class Stage( object ):
+    ''' Times a with block into the active profiler. '''
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.add_time(self.name, time.perf_counter()-self.start)
+        return False
+
+
+class NullStage( object ):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_null_stage = NullStage()
+_profiler = None
+
+
+def enable(profiler=None):
+    ''' Starts recording into profiler (default: a new one), and returns it. '''
+    global _profiler
+    _profiler = profiler if profiler is not None else Profiler()
+    return _profiler
+
+
+def disable():
+    ''' Stops recording, and returns the profiler that was recording. '''
+    global _profiler
+    profiler, _profiler = _profiler, None
+    return profiler
+
+
+def active():
+    ''' The profiler that is recording, or None. '''
+    return _profiler
+
+
+def stage(name):
+    ''' Context manager timing its block as stage name (when enabled). '''
+    if _profiler is None:
+        return _null_stage
+    return Stage(_profiler, name)
+
+
+def count(name, n=1):
+    if _profiler is not None:
+        _profiler.count(name, n)
@@ -0,0 +1,67 @@
+''' Cached wavelength <-> pixel lookup tables.
+
+A table for one grism order is computed once and kept in the on-disk cache
+(see fakegrism.cache) under a hash of everything it depends on: the grism
+parameters, order, focal length, pixel size and sampling.  Later loads
+memory map the file.
+'''
+import os
+import numpy
+
+from fakegrism.cache import param_hash, cache_dir, cached_array
+from fakegrism.grism import FOCAL_LENGTH, PIXEL_PITCH, focal_plane_position, focal_plane_angle
+
+TABLE_VERSION = 1
+N_SAMPLES = 4096
+
+_tables = {}
+
+
+def table_params(grism, m, focal_length=FOCAL_LENGTH, pixel_size=PIXEL_PITCH, n_samples=N_SAMPLES):
+    return dict(version=TABLE_VERSION, grism=grism.name, sigma=grism.sigma, delta=grism.delta, n=grism.n,
+                l_start=grism.l_start, l_stop=grism.l_stop, m=float(m), focal_length=float(focal_length),
+                pixel_size=float(pixel_size), n_samples=int(n_samples))
+
+
+class WavelengthTable( object ):
+    ''' Dense tables for one grism order: pixel position (from the optical
+    axis) on a uniform wavelength grid from l_start to l_stop, and wavelength
+    on a uniform pixel grid spanning the same range. '''
+    def __init__(self, data):
+        self.data = data
+        self.wl_grid, self.pixel_at_wl, self.pixel_grid, self.wl_at_pixel = data
+
+    def to_pixel(self, wl):
+        return numpy.interp(wl, self.wl_grid, self.pixel_at_wl, left=numpy.nan, right=numpy.nan)
+
+    def to_wavelength(self, pixel):
+        return numpy.interp(pixel, self.pixel_grid, self.wl_at_pixel, left=numpy.nan, right=numpy.nan)
+
+
+def build_table(grism, m, focal_length=FOCAL_LENGTH, pixel_size=PIXEL_PITCH, n_samples=N_SAMPLES):
+    ''' (4, n_samples) array: wl_grid, pixel_at_wl, pixel_grid, wl_at_pixel.
+    The wavelength grid covers l_start to l_stop, less whatever order m
+    cannot diffract. '''
+    offset = grism.n*numpy.sin(numpy.radians(grism.delta))
+    l_start = max(grism.l_start, grism.sigma*(offset-1.0)/m)
+    l_stop = min(grism.l_stop, grism.sigma*(offset+1.0)/m)
+    if l_start >= l_stop:
+        raise ValueError('order %g of %s does not reach %g-%g' % (m, grism.name, grism.l_start, grism.l_stop))
+    wl_grid = numpy.linspace(l_start, l_stop, n_samples)
+    pixel_at_wl = focal_plane_position(grism.calc_beta(wl_grid, m), focal_length, pixel_size)
+    pixel_grid = numpy.linspace(pixel_at_wl.min(), pixel_at_wl.max(), n_samples)
+    wl_at_pixel = grism.calc_wl(focal_plane_angle(pixel_grid, focal_length, pixel_size), m)
+    return numpy.array([wl_grid, pixel_at_wl, pixel_grid, wl_at_pixel])
+
+
+def wavelength_table(grism, m, focal_length=FOCAL_LENGTH, pixel_size=PIXEL_PITCH, n_samples=N_SAMPLES, path=None):
+    ''' The lookup table for order m of grism, from memory, then from the disk
+    cache (path, or the default cache directory), and only then computed
+    (and saved).  Tables are kept in memory per cache directory, so a
+    lookup in another directory reads (or builds) that directory's table. '''
+    params = table_params(grism, m, focal_length, pixel_size, n_samples)
+    key = (param_hash('wavetable', params), os.path.abspath(cache_dir(path)))
+    if key not in _tables:
+        build = lambda: build_table(grism, m, focal_length, pixel_size, n_samples)
+        _tables[key] = WavelengthTable(cached_array('wavetable', params, build, path))
+    return _tables[key]
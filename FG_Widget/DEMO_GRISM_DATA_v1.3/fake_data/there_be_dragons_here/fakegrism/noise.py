@@ -0,0 +1,53 @@
+''' Random noise for whole frame cubes.
+
+All randomness in a synthetic data set comes from one NoiseModel: the read
+noise and dark current of every pixel and the sky weight of every slit
+position in every spectral column.  Each is drawn from its own numpy
+Generator, spawned from the model's seed, in a few bulk calls per chunk of
+frames.  Generators fill arrays element by element in order, so the values
+do not depend on the chunk size; nor, since nothing is drawn in worker
+processes, on how frames are spread over a process pool.
+'''
+import numpy
+import numpy.random
+
+
+class NoiseModel( object ):
+    ''' read_noise and dark_current are the mean counts per pixel per frame;
+    both are Poisson, so a pixel's noise is Poisson with mean read_noise +
+    dark_current. '''
+    def __init__(self, seed=None, read_noise=50, dark_current=0.0):
+        if not isinstance(seed, numpy.random.SeedSequence):
+            seed = numpy.random.SeedSequence(seed)
+        self.seed = seed
+        self.read_noise = read_noise
+        self.dark_current = dark_current
+        #the children seed.spawn(2) gives a fresh seed, without spawning from
+        #(and so changing) the caller's seed
+        pixel_seed, sky_seed = [numpy.random.SeedSequence(seed.entropy, spawn_key=seed.spawn_key+(i,),
+                                                          pool_size=seed.pool_size) for i in range(2)]
+        self.pixel_rng = numpy.random.default_rng(pixel_seed)
+        self.sky_rng = numpy.random.default_rng(sky_seed)
+
+    def pixel_noise(self, n_frames, ny, nx, dtype=numpy.float64):
+        ''' Read noise plus dark current for the next n_frames frames. '''
+        counts = self.pixel_rng.poisson(lam=self.read_noise+self.dark_current, size=(n_frames, ny, nx))
+        return counts.astype(dtype)
+
+    def sky_weights(self, n_frames, shapes, dtype=numpy.float64):
+        ''' Sky weights (squared unit normal deviates) for the next n_frames
+        frames: weights[i][k] is an array of shapes[k], usually (columns, slit
+        positions) for order k.  Drawn as a single array and split. '''
+        sizes = [int(numpy.prod(shape)) for shape in shapes]
+        draws = (self.sky_rng.standard_normal((n_frames, sum(sizes)))**2.0).astype(dtype)
+        bounds = numpy.cumsum([0] + sizes)
+        return [[frame[bounds[k]:bounds[k+1]].reshape(shape) for k, shape in enumerate(shapes)]
+                for frame in draws]
+
+    def chunks(self, n_frames, chunk, ny, nx, shapes=(), dtype=numpy.float64):
+        ''' Yields (pixel_noise, sky_weights) for n_frames frames, chunk frames
+        at a time, so that memory is bounded by the chunk size. '''
+        chunk = max(1, int(chunk or n_frames))
+        for start in range(0, n_frames, chunk):
+            n = min(chunk, n_frames-start)
+            yield self.pixel_noise(n, ny, nx, dtype), self.sky_weights(n, shapes, dtype)
@@ -0,0 +1,354 @@
+''' The generate(config) entry point.
+
+A config is a plain dict; any key left out takes its value from DEFAULTS
+(or from one of the PRESETS, when config['preset'] names one).
+'''
+import numpy
+import numpy.random
+
+from fakegrism import instrument
+from fakegrism.slit import Slit
+from fakegrism.frames import iter_frames, iter_tiles
+from fakegrism.spectrum import random_lines, order_spectra
+from fakegrism.truth import write_truth
+from fakegrism.grism import GRISMS
+from fakegrism.psf import wavelength_bin
+from fakegrism.atran import order_wavelengths, order_transmission
+from fakegrism.fitsio import CubeWriter, convert, read_cube
+from fakegrism.scene import Scene
+
+# G1xG2 cross-dispersed order endpoints
+XD_ORDERS = {
+    'x_right': [159, 255, 255, 255, 255, 255, 255, 255],
+    'x_left': [0, 0, 0, 0, 0, 0, 0, 0],
+    'y_right': [233, 210, 177, 143, 110, 84, 58, 38],
+    'y_left': [202, 162, 127, 98, 69, 46, 20, 0],
+    'm': [0, 1, 2, 3, 4, 5, 6, 7],
+}
+
+# G1 single-order endpoints
+SO_ORDERS = {
+    'x_right': [256],
+    'x_left': [0],
+    'y_right': [0],
+    'y_left': [0],
+    'm': [1],
+}
+
+DEFAULTS = dict(
+    slit_x=2,                # X dimension (in pixels)
+    slit_y=15,               # Y dimension (in pixels)
+    psf='airy',              # 'airy' or 'gaussian', or 'airy_table'/'gaussian_table' from a radial lookup table
+    wl=8e-4,                 # Nominal wavelength for the observation (in cm)
+    fwhm=2.0,                # sigma of the 'gaussian' PSF
+    sky_scale=10.0,
+    source_flux=500.0,       # peak counts of the point source where the spectrum is 1
+    scene=None,              # sources along the slit, replacing the point source (see fakegrism.scene)
+    scene_step=0.25,         # grid (in pixels along the slit) the scene is sampled on
+    oversample=1,            # PSF samples per pixel (in each direction)
+    psf_engine='direct',     # how the sky is built: 'direct' or 'fft' (see Slit)
+    psf_wavelength=None,     # 'order': each order's PSF at its own median wavelength, not wl;
+                             # needs the column wavelengths (see column_wavelengths)
+    psf_bins=100,            # PSF wavelength bins per unit of ln(wavelength), for psf_wavelength
+    source_position=[0.25, 0.75],
+    n_frames=2,
+    nx=256,
+    ny=256,
+    read_noise=50,           # mean read noise counts per pixel per frame
+    dark_current=0.0,        # mean dark counts per pixel per frame
+    noise_chunk=16,          # frames whose noise is drawn (and rendered) together
+    subpixel=True,           # place slit images at their fractional trace positions
+    tile_rows=None,          # rows per tile when frames are made a band at a time (None: whole frames)
+    max_lines=30,            # random lines per order, when lines is None
+    lines=None,              # line list: dict of order (index), center (column), depth, width arrays
+    wavelength=None,         # wavelength of each column, one array per order (default: from grism)
+    grism=None,              # name (in GRISMS) of the grism whose orders are m; sets the column wavelengths
+    atran=None,              # ATRAN model ('R200', 'R1000', 'R5000' or a file) for a telluric spectrum;
+                             # needs the column wavelengths (see column_wavelengths)
+    atran_dir=None,          # where the ATRAN models are (default: fakegrism.atran.ATRAN_DIR)
+    seed=None,
+    processes=1,
+    dtype='int32',           # output dtype (the detector's BITPIX 32)
+    accum_dtype='float32',   # dtype the slit images and frames are built in
+    data_file=None,
+    truth_file=None,
+    **XD_ORDERS
+)
+
+PRESETS = {
+    'G1': dict(SO_ORDERS, grism='G1'),
+    'G1xG2': dict(XD_ORDERS),
+    # the long-slit setup of the old make_fake_data.py
+    'G1_long': dict(SO_ORDERS, slit_y=256, psf='gaussian', sky_scale=1.0,
+                    source_position=[0.5, 0.5], m=[0]),
+}
+
+
+def make_config(config=None, **overrides):
+    ''' DEFAULTS, updated with the named preset, then config, then overrides. '''
+    merged = dict(DEFAULTS)
+    config = dict(config or {}, **overrides)
+    if config.get('preset') is not None:
+        if config['preset'] not in PRESETS:
+            raise ValueError('unknown preset: %r' % (config['preset'],))
+        merged.update(PRESETS[config['preset']])
+    merged.update(config)
+    return merged
+
+
+def order_endpoints(config):
+    ''' (x_right, x_left, y_right, y_left) for each order in config. '''
+    return list(zip(config['x_right'], config['x_left'], config['y_right'], config['y_left']))
+
+
+def nod_positions(config):
+    ''' The source position of every frame: config['source_position'],
+    repeated (ABAB...) to fill config['n_frames']. '''
+    source_position = list(config['source_position'])
+    n_frames = config['n_frames']
+    if len(source_position) < n_frames:
+        source_position = (source_position*n_frames)[:n_frames]
+    return source_position[:n_frames]
+
+
+def make_slit(config, wl=None):
+    ''' The Slit of config, with its PSF at wavelength wl (in cm; default:
+    config['wl']). '''
+    return Slit(config['slit_x'], config['slit_y'], wl=wl or config['wl'], psf=config['psf'],
+                fwhm=config['fwhm'], sky_scale=config['sky_scale'], dtype=config['accum_dtype'],
+                oversample=config['oversample'], engine=config['psf_engine'], source_flux=config['source_flux'])
+
+
+def column_wavelengths(config):
+    ''' The wavelength (in microns) of each column of each order of config:
+    config['wavelength'], or those of config['grism'], or None.  A config
+    whose telluric spectrum (atran) or per-order PSFs (psf_wavelength)
+    need them and has neither is rejected here.  Only a grism whose orders
+    are config['m'] gives them, so the single-grism setups do and G1xG2
+    does not: its m are placeholder
+    indices with hand-measured endpoints, not the G2 orders 14-23 of
+    xdisp_model.py, and its column wavelengths have to be given. '''
+    if config['wavelength'] is not None:
+        return config['wavelength']
+    if config['grism'] is not None:
+        return order_wavelengths(GRISMS[config['grism']], order_endpoints(config), config['m'], config['nx'])
+    needs = []
+    if config['atran'] is not None:
+        needs.append('atran=%r' % (config['atran'],))
+    if config['psf_wavelength'] == 'order':
+        needs.append("psf_wavelength='order'")
+    if needs:
+        raise ValueError('%s needs the column wavelengths: set grism (the grism whose orders are m) '
+                         'or wavelength' % ' and '.join(needs))
+    return None
+
+
+def psf_wavelengths(config, wavelength=None):
+    ''' The wavelength (in cm) of the PSF of each order: config['wl'], or
+    with config['psf_wavelength'] == 'order' the median wavelength of the
+    order's columns (wavelength, one array in microns per order; default:
+    column_wavelengths), put in bins of config['psf_bins'] per unit of ln(wavelength) so that orders of
+    about the same wavelength share their slit kernels.  Orders without a
+    wavelength (order 0) keep config['wl']. '''
+    n_orders = len(order_endpoints(config))
+    if config['psf_wavelength'] is None:
+        return [config['wl']]*n_orders
+    if config['psf_wavelength'] != 'order':
+        raise ValueError('unknown psf_wavelength: %r' % (config['psf_wavelength'],))
+    if wavelength is None:
+        wavelength = column_wavelengths(config)
+    result = []
+    for wl in wavelength:
+        wl = numpy.asarray(wl, dtype=numpy.float64)
+        wl = wl[numpy.isfinite(wl)]
+        result.append(wavelength_bin(1e-4*numpy.median(wl), config['psf_bins']) if len(wl) else config['wl'])
+    return result
+
+
+def order_slits(config, wavelength=None):
+    ''' One Slit per order of config, with its PSF at the order's
+    wavelength (see psf_wavelengths); orders in the same wavelength bin
+    share a Slit. '''
+    wls = psf_wavelengths(config, wavelength)
+    slits = {}
+    for wl in wls:
+        if wl not in slits:
+            slits[wl] = make_slit(config, wl)
+    return [slits[wl] for wl in wls]
+
+
+def input_spectrum(config, orders, wavelength, seed):
+    ''' The input spectrum (one flux array per order) of config: its line
+    list, the ATRAN telluric transmission, or random lines drawn from seed. '''
+    rng = numpy.random.default_rng(seed)
+    if config['lines'] is not None:
+        lines = config['lines']
+        line_list = (lines['order'], lines['center'], lines['depth'], lines['width'])
+    elif config['atran'] is not None:
+        #the telluric spectrum stands in for the random lines
+        line_list = ([], [], [], [])
+    else:
+        line_list = random_lines(orders, rng, config['max_lines'])
+    spectrum = order_spectra(orders, *line_list)
+    if config['atran'] is not None:
+        if wavelength is None:
+            wavelength = column_wavelengths(config)
+        transmission = order_transmission(config['atran'], wavelength, config['atran_dir'])
+        spectrum = [flux*t for flux, t in zip(spectrum, transmission)]
+    return spectrum
+
+
+def make_scene(config, orders, wavelength, spectrum):
+    ''' The Scene of config['scene'].  spectrum is the target's input
+    spectrum; a source with a seed for its spectrum gets its own, made as
+    the target's is (see input_spectrum). '''
+    spectra = []
+    for source in config['scene']:
+        kind = source.get('spectrum')
+        if kind is None:
+            spectra.append(spectrum)
+        elif kind == 'flat':
+            spectra.append([numpy.ones(len(flux)) for flux in spectrum])
+        elif isinstance(kind, int) and not isinstance(kind, bool):
+            spectra.append(input_spectrum(config, orders, wavelength, kind))
+        else:
+            raise ValueError('unknown source spectrum: %r' % (kind,))
+    return Scene(config['scene'], spectra, config['slit_y'], config['scene_step'])
+
+
+class NodSequence( object ):
+    ''' A synthetic nod sequence whose frames are made on demand.
+
+    Creating one merges the config and builds the input spectrum (and
+    wavelengths), which are then available as attributes; no frame is made
+    until the sequence is iterated.  Iterating yields the (ny, nx) frames
+    one at a time in config['dtype'], each made as it is asked for, so a
+    consumer that handles one frame at a time (a FITS writer, a quick-look
+    display, a reduction under test) runs in memory bounded by
+    config['noise_chunk'] frames however long the sequence is.
+
+        for frame in NodSequence(preset='G1xG2', n_frames=10000, seed=1):
+            ...
+
+    Every iteration starts the sequence over and yields the same frames. '''
+    def __init__(self, config=None, **overrides):
+        self.config = config = make_config(config, **overrides)
+        self.orders = order_endpoints(config)
+        self.n_frames = config['n_frames']
+        self.shape = (self.n_frames, config['ny'], config['nx'])
+        self.dtype = numpy.dtype(config['dtype'])
+        self.source_position = nod_positions(config)
+
+        self.wavelength = column_wavelengths(config)
+
+        spectrum_seed, self.frame_seed = numpy.random.SeedSequence(config['seed']).spawn(2)
+        with instrument.stage('spectrum'):
+            self.spectrum = input_spectrum(config, self.orders, self.wavelength, spectrum_seed)
+        self.slits = order_slits(config, self.wavelength)
+        self.scene = None
+        if config['scene']:
+            self.scene = make_scene(config, self.orders, self.wavelength, self.spectrum)
+
+    def __len__(self):
+        return self.n_frames
+
+    def __iter__(self):
+        return self.iterate()
+
+    def iterate(self, progress=None):
+        ''' Yields the frames; progress, if given, is called as
+        progress(i, n_frames) once frame i (counting from 1) is made.  With
+        config['tile_rows'] set, each frame is put together from its tiles. '''
+        config = self.config
+        if config['tile_rows']:
+            frame = None
+            for i, row, tile in self.tiles():
+                if row == 0:
+                    frame = numpy.empty(self.shape[1:], dtype=self.dtype)
+                frame[row:row+len(tile)] = tile
+                if row+len(tile) == self.shape[1]:
+                    if progress is not None:
+                        progress(i+1, self.n_frames)
+                    yield frame
+            return
+        frames = iter_frames(self.slits, self.source_position, self.orders, self.spectrum, self.frame_seed,
+                             config['nx'], config['ny'], config['read_noise'], config['processes'],
+                             dark_current=config['dark_current'], chunk=config['noise_chunk'],
+                             subpixel=config['subpixel'], scene=self.scene)
+        for i, frame in enumerate(frames):
+            with instrument.stage('convert'):
+                frame = convert(frame, self.dtype)
+            if progress is not None:
+                progress(i+1, self.n_frames)
+            yield frame
+
+    def tiles(self, progress=None):
+        ''' Yields (frame, row, tile) bands of config['tile_rows'] rows (default
+        256) of every frame in turn, in config['dtype'] (see iter_tiles). '''
+        config = self.config
+        tiles = iter_tiles(self.slits, self.source_position, self.orders, self.spectrum, self.frame_seed,
+                           config['nx'], config['ny'], config['read_noise'], config['processes'],
+                           dark_current=config['dark_current'], chunk=config['noise_chunk'],
+                           subpixel=config['subpixel'], tile_rows=config['tile_rows'] or 256,
+                           scene=self.scene)
+        for i, row, tile in tiles:
+            with instrument.stage('convert'):
+                tile = convert(tile, self.dtype)
+            if progress is not None and row+len(tile) == self.shape[1]:
+                progress(i+1, self.n_frames)
+            yield i, row, tile
+
+    def write_truth(self, filename=None):
+        ''' Writes the input spectrum to filename (default:
+        config['truth_file']).  With a scene, that is the target's spectrum,
+        the one its sources without a spectrum of their own share. '''
+        with instrument.stage('truth'):
+            write_truth(filename or self.config['truth_file'], self.orders, self.spectrum, self.config['m'],
+                        self.wavelength)
+
+    def write(self, filename=None, progress=None):
+        ''' Streams the frames to the FITS file filename (default:
+        config['data_file']) as they are made. '''
+        filename = filename or self.config['data_file']
+        with CubeWriter(filename, self.n_frames, self.shape[1], self.shape[2], self.dtype) as writer:
+            if self.config['tile_rows']:
+                for i, row, tile in self.tiles(progress):
+                    with instrument.stage('fits_write'):
+                        writer.write_tile(i, row, tile)
+                return
+            for frame in self.iterate(progress):
+                with instrument.stage('fits_write'):
+                    writer.write(frame)
+
+    def frames(self, progress=None):
+        ''' All the frames, as one (n_frames, ny, nx) array. '''
+        frames = numpy.zeros(self.shape, dtype=self.dtype)
+        for i, frame in enumerate(self.iterate(progress)):
+            frames[i] = frame
+        return frames
+
+
+def generate(config=None, progress=None, **overrides):
+    ''' Generates a synthetic nod sequence.
+
+    Returns a dict holding the merged config, the input spectrum (one flux
+    array per order) and the (n_frames, ny, nx) frames.  With config['atran']
+    set, the spectrum is the ATRAN telluric transmission of each column (times
+    any config['lines']) instead of random lines.  The frames are
+    streamed to config['data_file'] and the spectrum written to
+    config['truth_file'] (as text, .npy or FITS table, by extension) when
+    those are set; nothing is written otherwise.  progress, if given, is
+    called as progress(i, n_frames) after each frame.  To take the frames
+    one at a time instead, iterate over a NodSequence. '''
+    sequence = NodSequence(config, **overrides)
+    config = sequence.config
+    if config['truth_file']:
+        sequence.write_truth()
+    if config['data_file']:
+        #streams the frames to disk as they are made; the returned frames are
+        #a read-only memory map of the file
+        sequence.write(progress=progress)
+        frames = read_cube(config['data_file'])
+    else:
+        frames = sequence.frames(progress)
+    return {'config': config, 'spectrum': sequence.spectrum, 'frames': frames}
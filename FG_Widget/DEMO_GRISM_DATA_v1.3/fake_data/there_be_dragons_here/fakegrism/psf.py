@@ -0,0 +1,95 @@
+import numpy
+import scipy.special
+
+# Optics of the FORCAST grism camera (all lengths in cm)
+PIXEL_SIZE = 50e-4     # length of side of pixel
+F_LENGTH = 15.494      # focal length
+BEAM_DIAMETER = 2.54   # beam diameter
+AIRY_RADIUS = 15       # PSF is truncated outside this radius (in pixels)
+RADIAL_STEP = 1.0/1024 # radius sampling of the radial profile tables (in pixels)
+PSF_BINS = 100         # PSF wavelength bins per unit of ln(wavelength) (1% wide)
+
+# RadialPSF tables, keyed on the PSF, its (binned) wavelength or width, and step
+_radial_cache = {}
+
+
+def airy_scale(wl):
+    ''' Converts a radius (in pixels) to the argument of the Airy function at
+    wavelength wl (in cm). '''
+    l = wl/PIXEL_SIZE
+    f_length = F_LENGTH/PIXEL_SIZE   # focal length (in pixels)
+    d = BEAM_DIAMETER/PIXEL_SIZE     # Beam diameter (in pixels)
+    return 3.1415926/(l*(f_length/d))
+
+
+def airy_profile(x_airy):
+    ''' (2 J1(x)/x)**2, with the x -> 0 limit (1.0) taken analytically. '''
+    x_airy = numpy.asarray(x_airy, dtype=float)
+    profile = numpy.ones(x_airy.shape)
+    nonzero = x_airy != 0
+    xa = x_airy[nonzero]
+    profile[nonzero] = (2.0*scipy.special.j1(xa)/xa)**2.0
+    return profile
+
+
+def draw_airy(X, Y, x_c, y_c, wl):
+    ''' Airy PSF centered on (x_c, y_c), evaluated on the meshgrid X, Y.
+
+    All pixels inside AIRY_RADIUS are evaluated in a single vectorized call;
+    pixels outside it are zero. '''
+    r = numpy.hypot(X-x_c, Y-y_c)      # radius from optical axis (in pixels)
+    bm = r < AIRY_RADIUS
+    image = numpy.zeros(r.shape)
+    image[bm] = airy_profile(r[bm]*airy_scale(wl))
+    return image
+
+
+def draw_gaussian(X, Y, x_c, y_c, sigma):
+    ''' Circular Gaussian PSF of width sigma centered on (x_c, y_c), normalized
+    to unit volume (matplotlib's old mlab.bivariate_normal). '''
+    return numpy.exp(-((X-x_c)**2+(Y-y_c)**2)/(2.0*sigma**2))/(2.0*numpy.pi*sigma**2)
+
+
+class RadialPSF( object ):
+    ''' A circularly symmetric PSF tabulated at radii 0, step, 2*step, ...
+    up to its truncation radius, and drawn by linear interpolation in the
+    table.  The table is uniform, so the interpolation is an index and a
+    multiply-add per pixel, and drawing a stamp costs no more than the
+    radii themselves whatever the profile. '''
+    def __init__(self, profile, radius, step=RADIAL_STEP):
+        self.radius = radius
+        self.step = step
+        r = numpy.arange(0.0, radius+2*step, step)
+        self.profile = profile(r)
+        #slope to the next sample; 0 past the end, so that beyond it is flat
+        self.slope = numpy.append(numpy.diff(self.profile), 0.0)
+
+    def __call__(self, X, Y, x_c, y_c):
+        u = numpy.hypot(X-x_c, Y-y_c)/self.step
+        index = numpy.minimum(u, len(self.profile)-1).astype(int)
+        image = self.profile[index] + (u-index)*self.slope[index]
+        image[u >= self.radius/self.step] = 0.0
+        return image
+
+
+def wavelength_bin(wl, bins=PSF_BINS):
+    ''' wl rounded to the center of its bin, bins bins per unit of
+    ln(wl), so that nearby wavelengths share a PSF. '''
+    return float(numpy.exp(numpy.rint(numpy.log(wl)*bins)/bins))
+
+
+def radial_psf(psf, wl, fwhm, step=RADIAL_STEP):
+    ''' The (cached) RadialPSF of the 'airy' PSF at wavelength wl (in cm) or
+    of the 'gaussian' one of sigma fwhm. '''
+    key = (psf, wl if psf == 'airy' else fwhm, step)
+    if key not in _radial_cache:
+        if psf == 'airy':
+            scale = airy_scale(wl)
+            table = RadialPSF(lambda r: airy_profile(r*scale), AIRY_RADIUS, step)
+        elif psf == 'gaussian':
+            #truncated where it has fallen to 1e-12 of its peak
+            table = RadialPSF(lambda r: draw_gaussian(r, 0.0, 0.0, 0.0, fwhm), 7.5*fwhm, step)
+        else:
+            raise ValueError('unknown PSF: %r' % (psf,))
+        _radial_cache[key] = table
+    return _radial_cache[key]
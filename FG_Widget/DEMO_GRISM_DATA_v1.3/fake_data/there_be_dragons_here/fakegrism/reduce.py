@@ -0,0 +1,307 @@
+''' A NumPy-only reference reduction, to validate synthetic data against its
+truth spectrum.
+
+The frames are nod-subtracted in (A, B) pairs, which removes the read noise
+pedestal and, on average, the sky.  Each order is then extracted along the
+trace the generator placed it on (see fakegrism.render.order_trace), in an
+aperture around the positive (A) and the negative (B) image of the source:
+by a boxcar sum, and by optimal (Horne) weighting with the generator's own
+point source profile and the variance of the pair.  The apertures of every
+order and every pair at one nod position are gathered with one fancy index
+into the stack of differences, so the extraction is a handful of array
+operations whatever the number of orders, columns and frames.
+
+The extracted counts are compared with the truth spectrum as the generator
+imaged it: each column spread over its neighbours by the columns of the
+point source stamp, times source_flux.  validate() reports, for each order,
+the scale between the two (about 1 for the optimal extraction, the
+enclosed fraction of the aperture for the boxcar) and the rms of the
+residuals, next to the rms expected from the noise alone.
+
+    python -m fakegrism.reduce campaign/manifest.json
+'''
+import argparse
+import json
+import os
+import sys
+import numpy
+
+from fakegrism.render import order_trace
+from fakegrism.slit import slit_grid
+from fakegrism.truth import read_truth
+from fakegrism.fitsio import read_cube
+from fakegrism.pipeline import make_config, order_slits, order_endpoints, nod_positions
+
+ENCLOSED = 0.95     # flux fraction the default aperture aims to hold
+
+
+def nod_pairs(frames):
+    ''' (difference, variance): A-B and A+B of the successive (A, B) frame
+    pairs, as (n_pairs, ny, nx) float64.  A+B, the total counts, is the
+    Poisson variance of A-B.  A last unpaired frame is left out. '''
+    frames = numpy.asarray(frames)
+    n_pairs = len(frames)//2
+    if n_pairs == 0:
+        raise ValueError('nod subtraction needs at least two frames')
+    a = frames[0:2*n_pairs:2].astype(numpy.float64)
+    b = frames[1:2*n_pairs:2].astype(numpy.float64)
+    return a-b, numpy.maximum(a+b, 1.0)
+
+
+def source_image(slits, position):
+    ''' (offsets, stamps): the point source stamp at position along the slit
+    of each order (slits, one per order, as order_slits gives them) and the
+    offsets of the stamp rows from the source center. '''
+    stamps = []
+    for slit in slits:
+        slit.point_source(position)
+        stamps.append(slit.source().astype(numpy.float64))
+    x, y, x_pos, y_pos = slit_grid(slit.width, slit.length, slit.width_mult, slit.length_mult)
+    return y - (len(y)/2.0 + (position-0.5)*slit.length), numpy.array(stamps)
+
+
+def source_rows(config, slit, position):
+    ''' (order, columns, rows): every detector column of every order, its
+    order index, and the (fractional) rows of the source center at position
+    along the slit in the spectral columns whose stamps reach it, as the
+    generator placed them; rows[:, j] is that of the column whose stamp
+    column j falls on the detector column. '''
+    xdim = slit.width*slit.width_mult+1
+    ydim = slit.length*slit.length_mult+1
+    reach = numpy.floor(xdim/2.0) - numpy.arange(xdim)
+    order, columns, rows = [], [], []
+    for k, (x_right, x_left, y_right, y_left) in enumerate(order_endpoints(config)):
+        xrange, y_c = order_trace(x_right, x_left, y_right, y_left, slit.length/2.0)
+        on = (xrange >= 0) & (xrange < config['nx'])
+        #the trace, carried on past the ends of the order
+        slope = float((y_right - y_left))/float((x_right - x_left))
+        corner = y_c[on, numpy.newaxis] + reach*slope - numpy.floor(ydim/2.0)
+        if not config['subpixel']:
+            corner = numpy.ceil(corner)
+        order.append(numpy.full(on.sum(), k))
+        columns.append(xrange[on])
+        rows.append(corner + ydim/2.0 + (position-0.5)*slit.length)
+    return numpy.concatenate(order), numpy.concatenate(columns), numpy.concatenate(rows)
+
+
+def half_width(image, separation):
+    ''' Smallest aperture half width (in rows) holding ENCLOSED of the
+    source in every order, but no wider than keeps the apertures of two nods separation
+    rows apart from overlapping. '''
+    offsets, stamps = image
+    limit = int((abs(separation)-1)//2)
+    if limit < 1:
+        raise ValueError('the nod positions are too close to subtract (%g rows apart)' % (separation,))
+    enclosed = numpy.cumsum(stamps.sum(axis=2)[:, numpy.argsort(numpy.abs(offsets))], axis=1)
+    for h in range(1, limit):
+        n = (numpy.abs(offsets) <= h+0.5).sum()
+        if numpy.all(enclosed[:, n-1] >= ENCLOSED*enclosed[:, -1]):
+            return h
+    return limit
+
+
+def extract(difference, variance, order, columns, rows, sign, image, width):
+    ''' Boxcar and optimal extraction of the sources in columns of order, at
+    rows (see source_rows) and with sign +1 for a positive, -1 for a
+    negative image, from every pair at once.  The optimal weights are the
+    columns of the order's stamp (see source_image) shifted onto those rows
+    and normalized to unit total, so both extractions are in counts.  Returns (boxcar, boxcar_variance, optimal,
+    optimal_variance), each (n_pairs, n_apertures). '''
+    n_pairs, ny, nx = difference.shape
+    offsets, stamps = image
+    n_orders, ydim, xdim = stamps.shape
+    spread = stamps.sum(axis=1)[order]
+    total = spread.sum(axis=1)
+    center = (rows*spread).sum(axis=1)/total
+    R = numpy.rint(center).astype(int)[:, numpy.newaxis] + numpy.arange(-width, width+1)
+    inside = (R >= 0) & (R < ny)
+    R = numpy.clip(R, 0, ny-1)
+    C = columns[:, numpy.newaxis]
+    #linear interpolation between stamp rows (zero beyond them) is how the
+    #generator shifts a stamp by a fraction of a pixel (see
+    #fakegrism.render.shift_stamps); the offsets are a unit spaced grid
+    padded = numpy.zeros((n_orders, ydim+2, xdim))
+    padded[:, 1:-1] = stamps
+    k = order[:, numpy.newaxis]
+    P = numpy.zeros(R.shape)
+    for j in range(xdim):
+        u = numpy.clip(R - rows[:, j, numpy.newaxis] - offsets[0] + 1.0, 0.0, ydim+1.0)
+        i = numpy.minimum(u.astype(int), ydim)
+        f = u - i
+        P += (1.0-f)*padded[k, i, j] + f*padded[k, i+1, j]
+    P *= inside/total[:, numpy.newaxis]
+
+    D = difference[:, R, C]*(sign*inside)
+    V = variance[:, R, C]
+    boxcar = D.sum(axis=2)
+    boxcar_var = (V*inside).sum(axis=2)
+    weight = P/V
+    norm = (P*weight).sum(axis=2)
+    optimal = (weight*D).sum(axis=2)/norm
+    return boxcar, boxcar_var, optimal, 1.0/norm
+
+
+def reduce_nods(frames, config):
+    ''' Nod-subtracts and extracts every order of the frames of config.
+    Returns a dict of, per order, the 'columns' extracted and the 'boxcar'
+    and 'optimal' counts (and their variances, 'boxcar_variance' and
+    'optimal_variance') of each pair, as (n_pairs, n_columns) arrays, and
+    the aperture 'half_width'. '''
+    config = make_config(config)
+    difference, variance = nod_pairs(frames)
+    positions = nod_positions(config)
+    slits = order_slits(config)
+    n_orders = len(slits)
+
+    result = dict((name, [None]*n_orders) for name in
+                  ('columns', 'boxcar', 'boxcar_variance', 'optimal', 'optimal_variance'))
+    #pairs nodded between the same two positions are extracted together
+    groups = {}
+    for i in range(len(difference)):
+        groups.setdefault((positions[2*i], positions[2*i+1]), []).append(i)
+    widths = []
+    for (a, b), pairs in sorted(groups.items()):
+        image_a, image_b = source_image(slits, a), source_image(slits, b)
+        width = half_width(image_a, (b-a)*slits[0].length)
+        widths.append(width)
+        order, columns, rows = source_rows(config, slits[0], a)
+        rows_b = source_rows(config, slits[0], b)[2]
+        extracted = [extract(difference[pairs], variance[pairs], order, columns, rows, sign, image, width)
+                     for rows, sign, image in ((rows, 1.0, image_a), (rows_b, -1.0, image_b))]
+        (box_a, box_var_a, opt_a, opt_var_a), (box_b, box_var_b, opt_b, opt_var_b) = extracted
+        #the A and B images of a pair: boxcars averaged, optimal estimates
+        #combined by inverse variance
+        boxcar = 0.5*(box_a+box_b)
+        boxcar_var = 0.25*(box_var_a+box_var_b)
+        inverse = 1.0/opt_var_a + 1.0/opt_var_b
+        optimal = (opt_a/opt_var_a + opt_b/opt_var_b)/inverse
+        for k in range(n_orders):
+            on = order == k
+            for name, values in (('boxcar', boxcar), ('boxcar_variance', boxcar_var),
+                                 ('optimal', optimal), ('optimal_variance', 1.0/inverse)):
+                if result[name][k] is None:
+                    result[name][k] = numpy.zeros((len(difference), on.sum()))
+                result[name][k][pairs] = values[:, on]
+            result['columns'][k] = columns[on]
+    result['half_width'] = max(widths)
+    return result
+
+
+def model_counts(config, spectrum, position=None):
+    ''' The counts the generator put into each detector column of each order
+    for the spectrum (one array per order): each column's flux times
+    source_flux, spread over the neighbouring columns by the order's point
+    source stamp at position (default: the first nod). '''
+    config = make_config(config)
+    slits = order_slits(config)
+    if position is None:
+        position = nod_positions(config)[0]
+    offsets, stamps = source_image(slits, position)
+    half = stamps.shape[2]//2
+    model = []
+    for (x_right, x_left, y_right, y_left), flux, stamp in zip(order_endpoints(config), spectrum, stamps):
+        counts = numpy.convolve(numpy.asarray(flux, dtype=numpy.float64), stamp.sum(axis=0))[half:half+len(flux)]
+        xrange = numpy.arange(x_left, x_right)
+        model.append((config['source_flux']*counts)[(xrange >= 0) & (xrange < config['nx'])])
+    return model
+
+
+def residuals(extracted, model, variance=None):
+    ''' scale (median ratio of extracted to model), rms of the residuals as
+    a fraction of the scaled median model, and the rms the noise alone
+    would give (when variance, of extracted, is given).  extracted is
+    (n_pairs, n_columns); its mean over the pairs is compared. '''
+    mean = extracted.mean(axis=0)
+    bright = model > 0.1*numpy.max(model)
+    scale = numpy.median(mean[bright]/model[bright])
+    level = scale*numpy.median(model[bright])
+    rms = numpy.sqrt(numpy.mean((mean[bright]-scale*model[bright])**2))/level
+    noise = numpy.nan
+    if variance is not None:
+        noise = numpy.sqrt(numpy.mean(variance[:, bright].mean(axis=0)/len(extracted)))/level
+    return scale, rms, noise
+
+
+def validate(frames, config, spectrum):
+    ''' Reduces the frames and compares every order with the truth spectrum
+    (one flux array per order).  Returns a list with a dict per order of m,
+    columns, half_width and the scale, rms and noise of the 'boxcar' and
+    'optimal' extractions (see residuals). '''
+    config = make_config(config)
+    if config['scene']:
+        raise ValueError('validate() models a single point source, not a scene')
+    extracted = reduce_nods(frames, config)
+    model = model_counts(config, spectrum)
+    report = []
+    for k, m in enumerate(config['m'][:len(model)]):
+        row = {'m': m, 'columns': len(model[k]), 'half_width': extracted['half_width']}
+        row['boxcar'] = residuals(extracted['boxcar'][k], model[k], extracted['boxcar_variance'][k])
+        row['optimal'] = residuals(extracted['optimal'][k], model[k], extracted['optimal_variance'][k])
+        report.append(row)
+    return report
+
+
+def split_truth(config, table):
+    ''' The flux column of a truth table (see fakegrism.truth), as one
+    array per order of config. '''
+    lengths = [x_right-x_left for x_right, x_left, y_right, y_left in order_endpoints(config)]
+    if sum(lengths) != len(table):
+        raise ValueError('the truth has %d columns; the config has %d' % (len(table), sum(lengths)))
+    return numpy.split(numpy.asarray(table['flux'], dtype=numpy.float64), numpy.cumsum(lengths)[:-1])
+
+
+def validate_record(filename):
+    ''' validate() for a dataset written by fakegrism.campaign, from its
+    record (.json) file. '''
+    with open(filename) as file:
+        record = json.load(file)
+    return validate_dataset(record, os.path.dirname(filename))
+
+
+def validate_dataset(record, directory='.'):
+    config = make_config(record['config'])
+    frames = read_cube(os.path.join(directory, record['data_file']))
+    spectrum = split_truth(config, read_truth(os.path.join(directory, record['truth_file'])))
+    return validate(frames, config, spectrum)
+
+
+def format_report(name, report):
+    lines = ['%s (aperture +/-%d rows)' % (name, report[0]['half_width']),
+             '%4s %7s %9s %9s %9s %9s %9s %9s' % ('m', 'columns', 'box scale', 'box rms', 'box noise',
+                                              'opt scale', 'opt rms', 'opt noise')]
+    for row in report:
+        lines.append('%4d %7d %9.4f %9.4f %9.4f %9.4f %9.4f %9.4f' % ((row['m'], row['columns']) + row['boxcar']
+                                                                    + row['optimal']))
+    return '\n'.join(lines)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='python -m fakegrism.reduce',
+                                     description='Extracts synthetic datasets and compares them with their truth.')
+    parser.add_argument('datasets', nargs='+', help='campaign dataset records (.json) or manifest.json files')
+    parser.add_argument('--tolerance', type=float, default=None,
+                        help='fail (exit 1) when an optimal rms exceeds this many times the noise')
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    failed = False
+    for filename in args.datasets:
+        with open(filename) as file:
+            content = json.load(file)
+        directory = os.path.dirname(filename)
+        records = content['datasets'] if 'datasets' in content else [content]
+        for record in records:
+            report = validate_dataset(record, directory)
+            print(format_report(os.path.join(directory, record['data_file']), report))
+            if args.tolerance is not None:
+                bad = [row['m'] for row in report if row['optimal'][1] > args.tolerance*row['optimal'][2]]
+                if bad:
+                    print('orders over tolerance: %s' % (', '.join(str(m) for m in bad),))
+                    failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,167 @@
+import numpy
+
+N_PHASES = 64   # fractional stamp offsets are rounded to 1/N_PHASES of a pixel
+
+# area-overlap weights of a shifted pixel, keyed on the number of phases
+_phase_weights = {}
+
+
+def order_trace(x_right, x_left, y_right, y_left, y_offset):
+    ''' Detector columns of an order and the (fractional) row of the slit
+    center in each one.  y_offset is added to the straight line between the
+    order endpoints (half the slit length, so that y_left/y_right are the
+    bottom edge of the slit image). '''
+    xrange = numpy.arange(x_left, x_right)
+    slope = float((y_right - y_left))/float((x_right - x_left))
+    y_c = (y_left + y_offset) + (xrange - x_left)*slope
+    return xrange, y_c
+
+
+def stamp_offsets(x_c, y_c, xdim, ydim, x0, y0):
+    ''' Array indices of the lower left corner of a (ydim, xdim) stamp centered
+    on (x_c, y_c), in a frame whose first pixel is at detector coordinates
+    (x0, y0).  These are the pixels selected by
+
+        (X >= x_c-floor(xdim/2)) & (X < x_c+floor(xdim/2)+xdim%2)
+
+    (and the same in Y) on an integer detector grid. '''
+    col = numpy.ceil(numpy.asarray(x_c) - numpy.floor(xdim/2.0)).astype(int) - int(x0)
+    row = numpy.ceil(numpy.asarray(y_c) - numpy.floor(ydim/2.0)).astype(int) - int(y0)
+    return row, col
+
+
+def add_stamps(Z, stamps, rows, cols):
+    ''' Adds stamps[k] into Z with its lower left corner at Z[rows[k], cols[k]].
+
+    All stamps are scattered in one bincount over their flattened frame
+    indices, so overlapping stamps accumulate and the cost is one pass over the
+    stamp pixels plus one over the frame, rather than one frame-sized mask per
+    stamp. '''
+    n, ydim, xdim = stamps.shape
+    rows = numpy.asarray(rows).reshape(n, 1, 1)
+    cols = numpy.asarray(cols).reshape(n, 1, 1)
+    if (rows.min() < 0) or (cols.min() < 0) or (rows.max()+ydim > Z.shape[0]) or (cols.max()+xdim > Z.shape[1]):
+        raise ValueError('stamp falls outside the frame')
+    index = (rows + numpy.arange(ydim).reshape(1, ydim, 1))*Z.shape[1] + (cols + numpy.arange(xdim).reshape(1, 1, xdim))
+    Z += numpy.bincount(index.ravel(), weights=stamps.ravel(), minlength=Z.size).reshape(Z.shape)
+    return Z
+
+
+def phase_weights(n_phases=N_PHASES):
+    ''' (n_phases+1, 2) array: the fractions of a pixel shifted by
+    phase/n_phases of a pixel that fall in the pixel it started in and in
+    the next one.  Each row sums to 1, so shifting conserves flux. '''
+    if n_phases not in _phase_weights:
+        shift = numpy.arange(n_phases+1)/float(n_phases)
+        _phase_weights[n_phases] = numpy.array([1.0-shift, shift]).T
+    return _phase_weights[n_phases]
+
+
+def subpixel_offsets(x_c, y_c, xdim, ydim, x0, y0, n_phases=N_PHASES):
+    ''' Like stamp_offsets, for stamps placed exactly on (x_c, y_c): array
+    indices of the pixel each stamp's lower left corner falls in, and the
+    phases (0 to n_phases) of the fractional part of its position. '''
+    index, phases = [], []
+    for center, dim, origin in ((y_c, ydim, y0), (x_c, xdim, x0)):
+        corner = numpy.asarray(center, dtype=float) - numpy.floor(dim/2.0)
+        base = numpy.floor(corner)
+        index.append(base.astype(int) - int(origin))
+        phases.append(numpy.rint((corner-base)*n_phases).astype(int))
+    return index[0], index[1], phases[0], phases[1]
+
+
+def shift_stamps(stamps, y_phase, x_phase, n_phases=N_PHASES):
+    ''' stamps moved up by y_phase and right by x_phase (in 1/n_phases of a
+    pixel), by splitting every pixel between the two it then overlaps.  An
+    axis along which any stamp moves grows by one pixel. '''
+    weights = phase_weights(n_phases)
+    for axis, phase in ((1, y_phase), (2, x_phase)):
+        if not numpy.any(phase):
+            continue
+        shape = list(stamps.shape)
+        shape[axis] += 1
+        shifted = numpy.zeros(shape, dtype=stamps.dtype)
+        w = weights[phase].astype(stamps.dtype)
+        lo = [slice(None)]*3
+        hi = [slice(None)]*3
+        lo[axis] = slice(0, -1)
+        hi[axis] = slice(1, None)
+        shifted[tuple(lo)] += w[:, 0, numpy.newaxis, numpy.newaxis]*stamps
+        shifted[tuple(hi)] += w[:, 1, numpy.newaxis, numpy.newaxis]*stamps
+        stamps = shifted
+    return stamps
+
+
+def add_clipped_stamps(Z, stamps, rows, cols):
+    ''' Like add_stamps, but stamps may reach past the edges of Z (or miss it
+    altogether); only their pixels inside Z are added.  The pixels are
+    summed at float64 onto what Z holds, one after another in stamp order,
+    in one bincount whose input starts with the part of Z the stamps cover.
+    Into a float64 Z, the stamps of an order added over any number of calls
+    then sum to exactly what a single bincount over all of them does (see
+    render_box), so that an order can be rendered a few columns at a time. '''
+    n, ydim, xdim = stamps.shape
+    rows = numpy.asarray(rows)
+    cols = numpy.asarray(cols)
+    r0, r1 = max(int(rows.min()), 0), min(int(rows.max())+ydim, Z.shape[0])
+    c0, c1 = max(int(cols.min()), 0), min(int(cols.max())+xdim, Z.shape[1])
+    if (r0 >= r1) or (c0 >= c1):
+        return Z
+    box = Z[r0:r1, c0:c1]
+    r = (rows-r0).reshape(n, 1, 1) + numpy.arange(ydim).reshape(1, ydim, 1)
+    c = (cols-c0).reshape(n, 1, 1) + numpy.arange(xdim).reshape(1, 1, xdim)
+    inside = (r >= 0) & (r < box.shape[0]) & (c >= 0) & (c < box.shape[1])
+    index = numpy.concatenate([numpy.arange(box.size), (r*box.shape[1] + c)[inside]])
+    weights = numpy.concatenate([box.ravel(), stamps[inside]])
+    box[...] = numpy.bincount(index, weights=weights, minlength=box.size).reshape(box.shape)
+    return Z
+
+
+def place_stamps(x0, y0, stamps, x_c, y_c, subpixel=False, n_phases=N_PHASES):
+    ''' The stamps of an order, and the array indices (rows, cols) of their
+    lower left corners in a frame whose first pixel is at detector
+    coordinates (x0, y0).
+
+    By default each stamp goes on the pixel grid, with its fractional
+    position rounded up (as the original frame loop did); with subpixel,
+    it is shifted to its exact position (to 1/n_phases of a pixel),
+    conserving flux. '''
+    n, ydim, xdim = stamps.shape
+    if subpixel:
+        rows, cols, y_phase, x_phase = subpixel_offsets(x_c, y_c, xdim, ydim, x0, y0, n_phases)
+        stamps = shift_stamps(stamps, y_phase, x_phase, n_phases)
+    else:
+        rows, cols = stamp_offsets(x_c, y_c, xdim, ydim, x0, y0)
+    return stamps, rows, cols
+
+
+def render_order(Z, x0, y0, stamps, x_c, y_c, subpixel=False, n_phases=N_PHASES):
+    ''' Places one stamp per spectral column of an order into the padded frame
+    Z, whose first pixel is at detector coordinates (x0, y0) (see
+    place_stamps). '''
+    return add_stamps(Z, *place_stamps(x0, y0, stamps, x_c, y_c, subpixel, n_phases))
+
+
+def render_box(stamps, x_c, y_c, subpixel=False, n_phases=N_PHASES, dtype=None):
+    ''' Renders an order into the smallest box that holds all its stamps.
+    Returns (row, col, box): box belongs at detector pixel (col, row) and up,
+    and may reach past the edges of the detector (see add_box). '''
+    stamps, rows, cols = place_stamps(0, 0, stamps, x_c, y_c, subpixel, n_phases)
+    n, ydim, xdim = stamps.shape
+    row = int(rows.min())
+    col = int(cols.min())
+    box = numpy.zeros([int(rows.max())-row+ydim, int(cols.max())-col+xdim], dtype=dtype or stamps.dtype)
+    return row, col, add_stamps(box, stamps, rows-row, cols-col)
+
+
+def add_box(frame, row, col, box):
+    ''' Adds the part of box that overlaps frame into frame, with the first
+    pixel of box at frame[row, col].  Both are indexed with slices, so
+    nothing is copied beyond the overlap itself. '''
+    ny, nx = frame.shape
+    height, width = box.shape
+    r0, r1 = max(row, 0), min(row+height, ny)
+    c0, c1 = max(col, 0), min(col+width, nx)
+    if (r0 < r1) and (c0 < c1):
+        frame[r0:r1, c0:c1] += box[r0-row:r1-row, c0-col:c1-col]
+    return frame
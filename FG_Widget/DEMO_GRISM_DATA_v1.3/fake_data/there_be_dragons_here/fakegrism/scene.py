@@ -0,0 +1,93 @@
+''' Scenes: any number of sources along the slit.
+
+A scene is a list of sources, each a dict (plain JSON, so that scenes can be
+set in a config file or swept by a campaign):
+
+    [
+        {'offset': 0.0},
+        {'offset': 4.0, 'flux': 0.3, 'spectrum': 7},
+        {'offset': -3.0, 'flux': 2.0, 'profile': 'gaussian', 'sigma': 2.5},
+    ]
+
+offset is where the source is along the slit, in pixels from the nod
+position (towards larger source positions), and moves with it from frame
+to frame.  flux scales its spectrum (which source_flux then scales as it
+does the single point source).  spectrum is None for the target's input
+spectrum, 'flat', or a seed for a spectrum of its own (see
+fakegrism.pipeline.input_spectrum).  profile is 'point' (the default),
+'gaussian' (of width sigma, in pixels) or 'uniform' (width pixels long).
+
+Extended sources are sampled every step pixels along the slit, and every
+point source and sample is put on that same grid of offsets, so that the
+image of the whole scene in one spectral column is a weighted sum of the
+point source kernels at the distinct positions, each built once and cached
+(see fakegrism.slit.source_kernel).  For each order, the weights of all its
+columns are one (n_columns, n_positions) matrix, and its source images one
+matrix product of that with the stack of kernels: the cost grows with the
+number of distinct positions, not with sources x columns.  Whatever falls
+off the ends of the slit is blocked by it.
+'''
+import numpy
+
+SCENE_STEP = 0.25   # grid (in pixels along the slit) sources are put on
+N_SIGMA = 4.0       # gaussian sources are sampled out to this many sigma
+
+
+def source_samples(source, step=SCENE_STEP):
+    ''' Offsets (in pixels) and weights (summing to its flux) of the points
+    a source is sampled at. '''
+    profile = source.get('profile', 'point')
+    flux = float(source.get('flux', 1.0))
+    offset = float(source.get('offset', 0.0))
+    if profile == 'point':
+        return numpy.array([offset]), numpy.array([flux])
+    elif profile == 'gaussian':
+        sigma = float(source['sigma'])
+        n = int(numpy.ceil(N_SIGMA*sigma/step))
+        x = numpy.arange(-n, n+1)*step
+        weights = numpy.exp(-x**2/(2.0*sigma**2))
+    elif profile == 'uniform':
+        n = max(int(round(float(source['width'])/step)), 1)
+        x = (numpy.arange(n) - (n-1)/2.0)*step
+        weights = numpy.ones(n)
+    else:
+        raise ValueError('unknown source profile: %r' % (profile,))
+    return offset + x, flux*weights/weights.sum()
+
+
+class Scene( object ):
+    ''' The sources of a scene (see the module docstring) on a slit length
+    pixels long.  spectra holds the spectrum of each source, as a list of
+    flux arrays, one per order. '''
+    def __init__(self, sources, spectra, length, step=SCENE_STEP):
+        if len(sources) != len(spectra):
+            raise ValueError('%d spectra for %d sources' % (len(spectra), len(sources)))
+        self.length = length
+        self.step = step
+        self.spectra = spectra
+        samples = [source_samples(source, step) for source in sources]
+        grid = numpy.concatenate([numpy.rint(x/step).astype(int) for x, w in samples])
+        grid, index = numpy.unique(grid, return_inverse=True)
+        #offsets of the distinct grid points, as fractions of the slit length
+        self.offsets = grid*step/float(length)
+        #weight of every source at every grid point
+        self.weights = numpy.zeros((len(grid), len(sources)))
+        source = numpy.repeat(numpy.arange(len(sources)), [len(w) for x, w in samples])
+        numpy.add.at(self.weights, (index.ravel(), source), numpy.concatenate([w for x, w in samples]))
+        self._order_flux = {}
+
+    def __len__(self):
+        ''' Number of distinct positions (kernels) of the scene. '''
+        return len(self.offsets)
+
+    def order_flux(self, position, k):
+        ''' (positions, flux): the positions along the slit (0 to 1, as
+        Slit.point_source takes them) of the scene nodded to position, and
+        the (n_columns, n_positions) flux at each in every column of order
+        k.  Positions off the slit are left out. '''
+        if k not in self._order_flux:
+            spectra = numpy.array([numpy.asarray(spectrum[k], dtype=numpy.float64) for spectrum in self.spectra])
+            self._order_flux[k] = numpy.dot(spectra.T, self.weights.T)
+        positions = position + self.offsets
+        on = (positions >= 0.0) & (positions <= 1.0)
+        return positions[on], self._order_flux[k][:, on]
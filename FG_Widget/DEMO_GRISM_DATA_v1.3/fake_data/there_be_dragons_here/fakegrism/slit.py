@@ -0,0 +1,215 @@
+import numpy
+import numpy.random
+
+from fakegrism import instrument
+from fakegrism.psf import draw_airy, draw_gaussian, radial_psf
+from fakegrism.convolve import SkyConvolver, binned_psf, element_kernel
+
+# Slit illumination kernels, keyed on what they are ('source', 'sky' or 'fft'),
+# the slit geometry and the PSF (and the point source location, for the
+# source): the point source image, the stack of sky PSFs, where stack[k] is
+# the PSF of the k-th position in the slit, and the SkyConvolver of the slit.
+_kernel_cache = {}
+
+
+def draw_psf(psf, X, Y, x_c, y_c, wl, fwhm):
+    ''' 'airy' draws the diffraction limited PSF at wavelength wl, 'gaussian' a
+    Gaussian whose sigma is fwhm (as the old make_fake_data.py did).
+    'airy_table' and 'gaussian_table' draw the same PSFs from a radial lookup
+    table (see fakegrism.psf.RadialPSF). '''
+    if psf in ('airy_table', 'gaussian_table'):
+        return radial_psf(psf[:-len('_table')], wl, fwhm)(X, Y, x_c, y_c)
+    elif psf == 'airy':
+        return draw_airy(X, Y, x_c, y_c, wl)
+    elif psf == 'gaussian':
+        return draw_gaussian(X, Y, x_c, y_c, fwhm)
+    raise ValueError('unknown PSF: %r' % (psf,))
+
+
+def slit_grid(width, length, width_mult, length_mult):
+    ''' Pixel centers (x, y) of the slit image stamp, and centers of the
+    pixel-sized slit elements along x and along y. '''
+    x = numpy.arange(0, width*width_mult+1, 1.0)
+    y = numpy.arange(0, length*length_mult+1, 1.0)
+    x_pos = numpy.arange(len(x)/2.0-width/2.0, len(x)/2.0+width/2.0, 1.0)
+    y_pos = numpy.arange(len(y)/2.0-length/2.0, len(y)/2.0+length/2.0, 1.0)
+    return x, y, x_pos, y_pos
+
+
+def element_offsets(x, y, x_pos, y_pos):
+    ''' Offsets of the stamp pixels from the first slit element, for every
+    element (see SkyConvolver). '''
+    return (numpy.arange(1-len(x_pos), len(x)) - x_pos[0],
+            numpy.arange(1-len(y_pos), len(y)) - y_pos[0])
+
+
+def source_kernel(width, length, width_mult, length_mult, wl, object_location, psf='airy', fwhm=2.0,
+                  dtype=numpy.float64, oversample=1):
+    ''' Returns the (cached) point source image of a slit, in dtype. '''
+    dtype = numpy.dtype(dtype)
+    key = ('source', width, length, width_mult, length_mult, wl, object_location, psf, fwhm, dtype, oversample)
+    if key not in _kernel_cache:
+        instrument.count('kernel_builds')
+        x, y, x_pos, y_pos = slit_grid(width, length, width_mult, length_mult)
+        draw = lambda X, Y, x_c, y_c: draw_psf(psf, X, Y, x_c, y_c, wl, fwhm)
+        ptsource = binned_psf(draw, x, y, len(x)/2.0, len(y)/2.0+(object_location-0.5)*length, oversample)
+        _kernel_cache[key] = ptsource.astype(dtype)
+    return _kernel_cache[key]
+
+
+def sky_kernels(width, length, width_mult, length_mult, wl, psf='airy', fwhm=2.0, dtype=numpy.float64, oversample=1):
+    ''' Returns the (cached) stack of per-position sky PSFs of a slit, in
+    dtype.  With oversample > 1 they are cut from the FFT element kernel. '''
+    dtype = numpy.dtype(dtype)
+    key = ('sky', width, length, width_mult, length_mult, wl, psf, fwhm, dtype, oversample)
+    if key not in _kernel_cache:
+        instrument.count('kernel_builds')
+        x, y, x_pos, y_pos = slit_grid(width, length, width_mult, length_mult)
+        if oversample == 1:
+            #one PSF for each position in the slit, in the order the sky weights are drawn
+            X, Y = numpy.meshgrid(x, y)
+            kernels = numpy.array([draw_psf(psf, X, Y, i, j, wl, fwhm) for i in x_pos for j in y_pos])
+        else:
+            draw = lambda X, Y, x_c, y_c: draw_psf(psf, X, Y, x_c, y_c, wl, fwhm)
+            kernel = element_kernel(draw, *element_offsets(x, y, x_pos, y_pos), oversample=oversample)
+            n_x, n_y = len(x_pos), len(y_pos)
+            kernels = numpy.array([kernel[n_y-1-j:n_y-1-j+len(y), n_x-1-i:n_x-1-i+len(x)]
+                                   for i in range(n_x) for j in range(n_y)])
+        _kernel_cache[key] = kernels.astype(dtype)
+    return _kernel_cache[key]
+
+
+def slit_kernels(width, length, width_mult, length_mult, wl, object_location, psf='airy', fwhm=2.0,
+                 dtype=numpy.float64, oversample=1):
+    ''' Returns the (cached) point source image and the stack of per-position
+    sky PSFs for a slit, in dtype.  With oversample > 1 each is averaged over
+    oversample x oversample points per pixel (and the sky over as many
+    points per slit element). '''
+    return (source_kernel(width, length, width_mult, length_mult, wl, object_location, psf, fwhm, dtype, oversample),
+            sky_kernels(width, length, width_mult, length_mult, wl, psf, fwhm, dtype, oversample))
+
+
+def slit_convolver(width, length, width_mult, length_mult, wl, psf='airy', fwhm=2.0, oversample=1):
+    ''' The (cached) SkyConvolver of a slit. '''
+    key = ('fft', width, length, width_mult, length_mult, wl, psf, fwhm, oversample)
+    if key not in _kernel_cache:
+        instrument.count('kernel_builds')
+        x, y, x_pos, y_pos = slit_grid(width, length, width_mult, length_mult)
+        draw = lambda X, Y, x_c, y_c: draw_psf(psf, X, Y, x_c, y_c, wl, fwhm)
+        kernel = element_kernel(draw, *element_offsets(x, y, x_pos, y_pos), oversample=oversample)
+        _kernel_cache[key] = SkyConvolver(kernel, len(x_pos), len(y_pos))
+    return _kernel_cache[key]
+
+
+def clear_kernel_cache():
+    _kernel_cache.clear()
+
+
+class Slit( object ):
+    ''' A slit width pixels across (detector X) and length pixels long
+    (detector Y).  The point source sits at object_location along the length.
+    Slit images are computed in dtype.
+
+    oversample > 1 averages the PSF over that many points per pixel (and
+    per slit element) in each direction.  engine is how the sky is built
+    from its per-element weights: 'direct' sums the per-element kernels;
+    'fft' convolves the weights with the element kernel (see
+    fakegrism.convolve) and never holds the per-element stack.  Either way
+    the oversampled kernels are built by FFT, in a time that hardly depends
+    on oversample. '''
+    def __init__(self, width, length, wl=8e-4, psf='airy', fwhm=2.0, sky_scale=10.0, dtype=numpy.float64,
+                 oversample=1, engine='direct', source_flux=500.0):
+        if engine not in ('direct', 'fft'):
+            raise ValueError('unknown slit engine: %r' % (engine,))
+        self.length = length
+        self.width = width
+        self.wl = wl               # Nominal wavelength for the observation (in cm)
+        self.psf = psf
+        self.FWHM = fwhm
+        self.sky_scale = sky_scale
+        self.source_flux = source_flux   # peak counts of the point source at unit flux
+        self.dtype = numpy.dtype(dtype)
+        self.oversample = int(oversample)
+        self.engine = engine
+        if (length > width):
+            self.orientation = 1   # Cross-Dispersed
+            self.length_mult = 3
+            self.width_mult = 3
+        else:
+            self.orientation = 0   # Single-order
+            self.length_mult = 3
+            self.width_mult = 3
+        self.object_location = -1.0
+
+    def point_source(self, position):
+        ''' Position along the slit of the point source. '''
+        self.object_location = position     # position along slit 0= top, 1 = bottom
+
+    def source(self):
+        return source_kernel(self.width, self.length, self.width_mult, self.length_mult,
+                             self.wl, self.object_location, self.psf, self.FWHM, self.dtype, self.oversample)
+
+    def sources(self, positions):
+        ''' (len(positions), ydim, xdim) stack of the point source images at
+        positions along the slit, times source_flux. '''
+        x, y, x_pos, y_pos = slit_grid(self.width, self.length, self.width_mult, self.length_mult)
+        stack = numpy.zeros((len(positions), len(y), len(x)), dtype=self.dtype)
+        for i, position in enumerate(positions):
+            stack[i] = source_kernel(self.width, self.length, self.width_mult, self.length_mult, self.wl,
+                                     position, self.psf, self.FWHM, self.dtype, self.oversample)
+        return stack*self.dtype.type(self.source_flux)
+
+    def kernels(self):
+        return slit_kernels(self.width, self.length, self.width_mult, self.length_mult,
+                            self.wl, self.object_location, self.psf, self.FWHM, self.dtype, self.oversample)
+
+    def convolver(self):
+        return slit_convolver(self.width, self.length, self.width_mult, self.length_mult,
+                              self.wl, self.psf, self.FWHM, self.oversample)
+
+    def n_positions(self):
+        ''' Number of slit elements (sky weights per slit image). '''
+        x, y, x_pos, y_pos = slit_grid(self.width, self.length, self.width_mult, self.length_mult)
+        return len(x_pos)*len(y_pos)
+
+    def sky(self, weights):
+        ''' Sky images for a (n, n_positions) stack of weights. '''
+        with instrument.stage('sky'):
+            if self.engine == 'fft':
+                return self.convolver().sky(weights).astype(self.dtype)
+            return numpy.tensordot(weights, self.kernels()[1], axes=1)
+
+    def slit_image(self, y_strength):
+        ptsource = self.source()
+
+        #creates the background by sending photons through each position in the slit
+        weights = numpy.random.randn(self.n_positions())**2.0
+        sky = self.sky(weights[numpy.newaxis])[0]
+
+        #Adds the background to the point source, returns the composite slit image
+        composite = numpy.round(self.sky_scale*sky) + numpy.round(ptsource*self.source_flux*y_strength)
+        return composite
+
+    def slit_images(self, y_strengths, rng=numpy.random, weights=None, positions=None):
+        ''' Slit images for a whole order at once, one per entry in y_strengths.
+        weights are the (len(y_strengths), slit positions) sky weights; when
+        not given they are drawn from rng, and with the default (global) rng
+        this gives the same stack as successive calls to slit_image.
+
+        With positions (along the slit) given, the source is a scene rather
+        than the point source: y_strengths is then (n, len(positions)), the
+        flux at each position, and the source images are one matrix product
+        of it with the stack of point source images (see
+        fakegrism.scene). '''
+        y_strengths = numpy.asarray(y_strengths, dtype=self.dtype)
+        if weights is None:
+            weights = rng.standard_normal((len(y_strengths), self.n_positions()))**2.0
+        weights = numpy.asarray(weights, dtype=self.dtype)
+        sky = self.sky(weights)
+        if positions is not None:
+            with instrument.stage('scene'):
+                source = numpy.tensordot(y_strengths, self.sources(positions), axes=1)
+            return numpy.round(self.dtype.type(self.sky_scale)*sky) + numpy.round(source)
+        ptsource = self.source()
+        composite = numpy.round(self.dtype.type(self.sky_scale)*sky) + numpy.round(ptsource[numpy.newaxis]*self.dtype.type(self.source_flux)*y_strengths[:, numpy.newaxis, numpy.newaxis])
+        return composite
@@ -0,0 +1,71 @@
+import numpy
+
+N_SIGMA = 5.0   # line profiles are cut off this many sigma from the line center
+
+
+def line_spectrum(x, center, depth, width, n_sigma=N_SIGMA):
+    ''' Transmission at x of any number of Gaussian absorption lines,
+
+        prod_k (1 - depth[k]*exp(-(x-center[k])**2/(2*width[k]**2)))
+
+    Each line is only evaluated within n_sigma*width of its center, and the
+    profiles are accumulated as optical depths in one bincount, so the cost
+    grows with the number of (line, pixel) pairs inside the windows rather
+    than with lines x pixels. '''
+    x = numpy.asarray(x, dtype=float)
+    center, depth, width = [numpy.atleast_1d(numpy.asarray(a, dtype=float)) for a in (center, depth, width)]
+    center, depth, width = numpy.broadcast_arrays(center, depth, width)
+    order = numpy.argsort(x, kind='stable')
+    xs = x[order]
+
+    lo = numpy.searchsorted(xs, center - n_sigma*width, side='left')
+    hi = numpy.searchsorted(xs, center + n_sigma*width, side='right')
+    counts = hi - lo
+    line = numpy.repeat(numpy.arange(len(center)), counts)
+    index = numpy.repeat(lo - numpy.cumsum(counts) + counts, counts) + numpy.arange(counts.sum())
+
+    profile = numpy.exp(-(xs[index]-center[line])**2.0/(2.0*width[line]**2.0))
+    with numpy.errstate(divide='ignore'):
+        tau = numpy.bincount(index, weights=numpy.log1p(-depth[line]*profile), minlength=len(xs))
+    flux = numpy.empty(len(xs))
+    flux[order] = numpy.exp(tau)
+    return flux
+
+
+def order_spectra(orders, line_order, center, depth, width, n_sigma=N_SIGMA):
+    ''' One line_spectrum per order, all orders in a single call.  orders are
+    (x_right, x_left, ...) endpoints; line_order[k] is the index (into orders)
+    of the order that line k falls in, and center[k] its column. '''
+    spans = [numpy.arange(order[1], order[0]) for order in orders]
+    line_order, center, depth, width = numpy.broadcast_arrays(line_order, center, depth, width)
+
+    #lays the orders end to end, far enough apart that no line window spans two
+    gap = 2.0*n_sigma*(width.max() if len(width) else 0.0) + 1.0
+    starts = numpy.cumsum([0.0] + [len(xr)+gap for xr in spans])
+    shift = [start - (xr[0] if len(xr) else 0) for start, xr in zip(starts, spans)]
+    x = numpy.concatenate([xr + s for xr, s in zip(spans, shift)] + [numpy.zeros(0)])
+    line_shift = numpy.asarray(shift)[line_order.astype(int)] if len(line_order) else numpy.zeros(0)
+
+    flux = line_spectrum(x, center + line_shift, depth, width, n_sigma)
+    return numpy.split(flux, numpy.cumsum([len(xr) for xr in spans])[:-1])
+
+
+def random_lines(orders, rng, max_lines=30):
+    ''' A random line list: up to max_lines lines per order, of random depth
+    and center and unit width.  Returns (line_order, center, depth, width). '''
+    nlines = rng.integers(0, max_lines, size=len(orders))  #Number of lines we will generate
+    line_order = numpy.repeat(numpy.arange(len(orders)), nlines)
+    x_right = numpy.array([order[0] for order in orders], dtype=float)[line_order]
+    x_left = numpy.array([order[1] for order in orders], dtype=float)[line_order]
+    draws = rng.random((len(line_order), 2))
+    depth = draws[:, 0]
+    center = draws[:, 1]*(x_right-x_left)+x_left
+    return line_order, center, depth, numpy.ones(len(line_order))
+
+
+def random_spectrum(x_right, x_left, rng, max_lines=30):
+    ''' Flat continuum over the columns of an order with a random number (up to
+    max_lines) of Gaussian absorption lines of random depth. '''
+    order = (x_right, x_left)
+    return order_spectra([order], *random_lines([order], rng, max_lines))[0]
+
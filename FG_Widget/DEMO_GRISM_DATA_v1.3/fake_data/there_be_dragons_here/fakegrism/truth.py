@@ -0,0 +1,81 @@
+''' The input ("truth") spectrum of a synthetic data set.
+
+The truth is written as text (the original format: a time stamp, then one
+"pixel, flux, order" line per column), as a .npy structured array, or as a
+FITS binary table, chosen by the file extension.  The binary forms hold a
+wavelength column too, and are written in one call and read back as a
+memory map.
+'''
+import os
+import time
+import numpy
+
+from fakegrism.fitsio import pyfits
+
+TRUTH_DTYPE = numpy.dtype([('pixel', 'i4'), ('flux', 'f8'), ('order', 'i4'), ('wavelength', 'f8')])
+
+
+def truth_table(orders, spectrum, m, wavelength=None):
+    ''' One record per column of each order.  wavelength, when given, is one
+    array per order; otherwise the wavelength column is NaN. '''
+    pixel = [numpy.arange(order[1], order[0]) for order in orders]
+    table = numpy.zeros(sum(len(p) for p in pixel), dtype=TRUTH_DTYPE)
+    table['pixel'] = numpy.concatenate(pixel)
+    table['flux'] = numpy.concatenate(spectrum)
+    table['order'] = numpy.repeat(m[:len(pixel)], [len(p) for p in pixel])
+    if wavelength is None:
+        table['wavelength'] = numpy.nan
+    else:
+        table['wavelength'] = numpy.concatenate(wavelength)
+    return table
+
+
+def truth_format(filename):
+    ext = os.path.splitext(filename)[1].lower()
+    if ext == '.npy':
+        return 'npy'
+    elif ext in ('.fits', '.fit', '.fts'):
+        return 'fits'
+    return 'text'
+
+
+def write_truth(filename, orders, spectrum, m, wavelength=None):
+    ''' Writes the input spectrum in the format given by the extension of
+    filename (see the module docstring). '''
+    fmt = truth_format(filename)
+    if fmt == 'text':
+        with open(filename, 'w') as file:
+            file.write(time.strftime("%a, %d %b %Y %H:%M:%S +0000", time.localtime()))
+            file.write('\n')
+            for order, flux, m_order in zip(orders, spectrum, m):
+                xrange = numpy.arange(order[1], order[0])
+                for xpt, ypt in zip(xrange, flux):
+                    file.write(str(xpt)+', '+str(ypt)+', '+str(m_order)+'\n')
+        return
+    table = truth_table(orders, spectrum, m, wavelength)
+    if fmt == 'npy':
+        numpy.save(filename, table)
+    else:
+        hdu = pyfits.BinTableHDU(table)
+        try:
+            hdu.writeto(filename, overwrite=True)
+        except TypeError:
+            hdu.writeto(filename, clobber=True)
+
+
+def read_truth(filename):
+    ''' The truth as a structured array with pixel, flux, order and wavelength
+    fields.  Binary files are memory mapped; text files are parsed (and have
+    NaN wavelengths). '''
+    fmt = truth_format(filename)
+    if fmt == 'npy':
+        return numpy.load(filename, mmap_mode='r')
+    elif fmt == 'fits':
+        return pyfits.getdata(filename, 1, memmap=True)
+    data = numpy.loadtxt(filename, delimiter=',', skiprows=1, ndmin=2)
+    table = numpy.zeros(len(data), dtype=TRUTH_DTYPE)
+    table['pixel'] = data[:, 0]
+    table['flux'] = data[:, 1]
+    table['order'] = data[:, 2]
+    table['wavelength'] = numpy.nan
+    return table
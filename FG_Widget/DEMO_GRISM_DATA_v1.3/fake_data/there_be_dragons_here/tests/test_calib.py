@@ -0,0 +1,25 @@
+import numpy
+
+from fakegrism.calib import master_dark, master_flat
+from fakegrism.dark import dark_frames
+
+
+def test_master_dark_is_the_mean_dark(tmp_path):
+    dark = master_dark(16, 8, n_frames=5, read_noise=50, dark_current=3.0, seed=2, path=str(tmp_path))
+    frames = dark_frames(5, 16, 8, 50, seed=2, dtype=numpy.float64, dark_current=3.0)
+    assert dark.shape == (8, 16)
+    numpy.testing.assert_allclose(dark, frames.mean(axis=0), rtol=1e-6)
+    numpy.testing.assert_allclose(dark.mean(), 53.0, rtol=0.02)
+    #the second call reads the cached master back
+    numpy.testing.assert_array_equal(master_dark(16, 8, n_frames=5, read_noise=50, dark_current=3.0, seed=2,
+                                                 path=str(tmp_path)), dark)
+
+
+def test_master_flat_recovers_the_response(tmp_path):
+    #the response master_flat draws for seed 2
+    response_seed = numpy.random.SeedSequence(2).spawn(2)[0]
+    response = 1.0 + 0.02*numpy.random.default_rng(response_seed).standard_normal((8, 16))
+    flat = master_flat(16, 8, n_frames=8, level=1e6, prnu=0.02, read_noise=50, seed=2, path=str(tmp_path))
+    assert numpy.median(flat) == 1.0
+    #Poisson noise of 1e6 counts in 8 frames: 3.5e-4
+    numpy.testing.assert_allclose(flat, response/numpy.median(response), atol=2e-3)
@@ -0,0 +1,53 @@
+import os
+import numpy
+
+from fakegrism.campaign import Campaign
+from fakegrism.fitsio import read_cube
+
+SPEC = {
+    'base': {'preset': 'G1', 'n_frames': 2},
+    'sweep': {'source_flux': [100.0, 500.0], 'slit_y': [15, 30]},
+}
+
+
+def test_resume_makes_only_missing(tmp_path):
+    campaign = Campaign(SPEC, str(tmp_path / 'out'))
+    assert len(campaign.pending()) == 4
+    assert campaign.run() == 4
+    assert campaign.pending() == []
+    assert campaign.run() == 0
+
+    tasks = campaign.tasks()
+    missing = tasks[1][3]
+    data = numpy.array(read_cube(missing['data']))
+    mtimes = [os.path.getmtime(paths['data']) for key, point, config, paths in tasks]
+    os.remove(missing['record'])
+
+    assert [task[0] for task in campaign.pending()] == [tasks[1][0]]
+    assert campaign.run() == 1
+    assert campaign.pending() == []
+    for i, (key, point, config, paths) in enumerate(tasks):
+        if i != 1:
+            assert os.path.getmtime(paths['data']) == mtimes[i]
+    #unseeded datasets get a seed from their config, so a remake is the same data
+    numpy.testing.assert_array_equal(read_cube(missing['data']), data)
+
+
+def test_unseeded_points_get_fixed_seeds(tmp_path):
+    seeds = [config['seed'] for key, point, config, paths in Campaign(SPEC, str(tmp_path)).tasks()]
+    assert None not in seeds
+    assert len(set(seeds)) == len(seeds)
+    assert seeds == [config['seed'] for key, point, config, paths in Campaign(SPEC, str(tmp_path)).tasks()]
+    spec = dict(SPEC, base=dict(SPEC['base'], seed=7))
+    assert all(config['seed'] == 7 for key, point, config, paths in Campaign(spec, str(tmp_path)).tasks())
+
+
+def test_workers_with_processes(tmp_path):
+    spec = dict(SPEC, base=dict(SPEC['base'], processes=2))
+    campaign = Campaign(spec, str(tmp_path / 'pool'))
+    assert campaign.run(workers=2) == 4
+    assert campaign.pending() == []
+    serial = Campaign(spec, str(tmp_path / 'serial'))
+    serial.run()
+    for (key, point, config, paths), other in zip(campaign.tasks(), serial.tasks()):
+        numpy.testing.assert_array_equal(read_cube(paths['data']), read_cube(other[3]['data']))
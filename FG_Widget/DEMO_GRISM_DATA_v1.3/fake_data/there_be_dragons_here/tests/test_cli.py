@@ -0,0 +1,11 @@
+from fakegrism.cli import main
+
+
+def test_bad_config_is_reported_not_raised(capsys):
+    assert main(['G1xG2', '-q', '-n', '1', '-s', 'atran="R1000"']) == 2
+    assert capsys.readouterr().err.startswith('fakegrism: atran=')
+
+
+def test_unknown_key_is_reported(capsys):
+    assert main(['G1', '-q', '-s', 'no_such_key=1']) == 2
+    assert capsys.readouterr().err == "fakegrism: bad --set 'no_such_key=1'\n"
@@ -0,0 +1,102 @@
+''' The optimized generator against the original implementations (kept in
+fakegrism.bench, which times the two). '''
+import numpy
+import pytest
+
+from fakegrism.psf import draw_airy, radial_psf
+from fakegrism.slit import Slit, sky_kernels, clear_kernel_cache
+from fakegrism.scene import Scene
+from fakegrism.render import N_PHASES, order_trace, render_order
+from fakegrism.frames import padded_grid, generate_frames
+from fakegrism.bench import (draw_airy_reference, slit_image_reference, render_order_reference,
+                             sky_kernels_reference, scene_images_reference, centroid_errors, G1XG2_ORDERS)
+
+WL = 8e-4
+
+
+@pytest.mark.parametrize('x_c, y_c', [(3.5, 23.0), (3.0, 23.0), (0.0, 0.0), (2.25, 40.75)])
+def test_draw_airy(x_c, y_c):
+    X, Y = numpy.meshgrid(numpy.arange(0, 7.0), numpy.arange(0, 46.0))
+    numpy.testing.assert_allclose(draw_airy(X, Y, x_c, y_c, WL), draw_airy_reference(X, Y, x_c, y_c, WL),
+                                  rtol=1e-10, atol=0.0)
+
+
+@pytest.mark.parametrize('length, position', [(15, 0.25), (30, 0.5), (15, 1.0)])
+def test_slit_image(length, position):
+    slit = Slit(2, length)
+    slit.point_source(position)
+    numpy.random.seed(1)
+    old = slit_image_reference(slit, 0.8)
+    numpy.random.seed(1)
+    numpy.testing.assert_array_equal(slit.slit_image(0.8), old)
+
+
+@pytest.mark.parametrize('order', G1XG2_ORDERS)
+def test_render_order(order):
+    slit = Slit(2, 15)
+    slit.point_source(0.25)
+    x, y = padded_grid(slit)
+    X, Y = numpy.meshgrid(x, y)
+    xrange, y_c = order_trace(order[0], order[1], order[2], order[3], slit.length/2.0)
+    stamps = slit.slit_images(numpy.random.default_rng(1).random(len(xrange)))
+    old = render_order_reference(numpy.zeros(X.shape), X, Y, stamps, xrange, y_c)
+    numpy.testing.assert_array_equal(render_order(numpy.zeros(X.shape), x[0], y[0], stamps, xrange, y_c), old)
+
+
+@pytest.mark.parametrize('processes', [2, 3])
+def test_frames_on_a_pool(processes):
+    slit = Slit(2, 15)
+    rng = numpy.random.default_rng(1)
+    spectrum = [rng.random(order[0]-order[1]) for order in G1XG2_ORDERS]
+    serial = generate_frames(slit, [0.25, 0.75]*2, G1XG2_ORDERS, spectrum, seed=1, processes=1)
+    parallel = generate_frames(slit, [0.25, 0.75]*2, G1XG2_ORDERS, spectrum, seed=1, processes=processes)
+    numpy.testing.assert_array_equal(parallel, serial)
+
+
+@pytest.mark.parametrize('oversample', [2, 4])
+def test_oversampled_sky_kernels(oversample):
+    clear_kernel_cache()
+    old = sky_kernels_reference(2, 15, oversample)
+    numpy.testing.assert_allclose(sky_kernels(2, 15, 3, 3, WL, oversample=oversample), old,
+                                  rtol=1e-9, atol=1e-9*old.max())
+
+
+@pytest.mark.parametrize('order', G1XG2_ORDERS[:2])
+def test_subpixel_conserves_flux(order):
+    slit = Slit(2, 15)
+    slit.point_source(0.5)
+    x, y = padded_grid(slit)
+    xrange, y_c = order_trace(order[0], order[1], order[2], order[3], slit.length/2.0)
+    stamps = numpy.repeat(slit.source()[numpy.newaxis], len(xrange), axis=0)
+    Z = render_order(numpy.zeros((len(y), len(x))), x[0], y[0], stamps, xrange, y_c, subpixel=True)
+    assert numpy.isclose(Z.sum(), stamps.sum(), rtol=1e-12)
+
+
+@pytest.mark.parametrize('order', G1XG2_ORDERS[:2])
+def test_subpixel_follows_trace(order):
+    slit = Slit(2, 15)
+    slit.point_source(0.5)
+    assert centroid_errors(slit, order).max() <= 0.5/N_PHASES + 1e-9
+
+
+@pytest.mark.parametrize('wl', [WL, WL/3.0])
+@pytest.mark.parametrize('x_c, y_c', [(15.0, 15.0), (15.5, 15.25), (0.0, 0.0)])
+def test_airy_table(wl, x_c, y_c):
+    #at a third of the wavelength the core is three times sharper
+    X, Y = numpy.meshgrid(numpy.arange(0, 31.0), numpy.arange(0, 31.0))
+    table = radial_psf('airy', wl, None)
+    numpy.testing.assert_allclose(table(X, Y, x_c, y_c), draw_airy(X, Y, x_c, y_c, wl), rtol=0.0, atol=1e-6)
+
+
+@pytest.mark.parametrize('n_sources, position', [(1, 0.5), (20, 0.4), (200, 0.5)])
+def test_scene_images(n_sources, position):
+    #sources of a scene (all on the slit) agree with adding them one at a time, to the rounding of the counts
+    rng = numpy.random.default_rng(1)
+    sources = [{'offset': float(offset), 'flux': 0.01} for offset in rng.integers(-20, 21, n_sources)*0.25]
+    spectra = [rng.random(255) for source in sources]
+    slit = Slit(2, 15, dtype=numpy.float64)
+    scene = Scene(sources, [[spectrum] for spectrum in spectra], 15)
+    positions, flux = scene.order_flux(position, 0)
+    new = slit.slit_images(flux, weights=numpy.zeros((255, slit.n_positions())), positions=positions)
+    old = scene_images_reference(slit, sources, position, spectra)
+    assert numpy.abs(new-old).max() <= 1.0
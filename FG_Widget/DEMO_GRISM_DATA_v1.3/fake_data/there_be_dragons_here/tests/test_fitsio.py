@@ -0,0 +1,40 @@
+import numpy
+import pytest
+
+from fakegrism.fitsio import CubeWriter, pyfits, read_cube
+
+
+@pytest.mark.parametrize('dtype', ['int16', 'int32', 'float32', 'float64'])
+def test_cube_round_trip(tmp_path, dtype):
+    filename = str(tmp_path / 'cube.fits')
+    frames = numpy.random.default_rng(1).uniform(-1000, 1000, (3, 5, 7)).astype(dtype)
+    header = pyfits.Header()
+    header['OBJECT'] = 'fake'
+    with CubeWriter(filename, 3, 5, 7, dtype=dtype, header=header) as writer:
+        for frame in frames:
+            writer.write(frame)
+        with pytest.raises(IndexError):
+            writer.write(frames[0])
+    cube = read_cube(filename)
+    assert cube.shape == (3, 5, 7)
+    assert cube.dtype.newbyteorder('=') == numpy.dtype(dtype)
+    numpy.testing.assert_array_equal(cube, frames)
+    written = pyfits.getheader(filename)
+    assert (written['NAXIS1'], written['NAXIS2'], written['NAXIS3']) == (7, 5, 3)
+    assert written['OBJECT'] == 'fake'
+
+
+def test_tiles_fill_frames(tmp_path):
+    filename = str(tmp_path / 'cube.fits')
+    frames = numpy.arange(2*6*4).reshape(2, 6, 4)
+    with CubeWriter(filename, 2, 6, 4, dtype='int32') as writer:
+        for index, frame in enumerate(frames):
+            for row in range(0, 6, 4):
+                writer.write_tile(index, row, frame[row:row+4])
+    numpy.testing.assert_array_equal(read_cube(filename), frames)
+
+
+def test_out_of_range_values_are_rejected(tmp_path):
+    with CubeWriter(str(tmp_path / 'cube.fits'), 1, 2, 2, dtype='int16') as writer:
+        with pytest.raises(ValueError):
+            writer.write(numpy.full((2, 2), 1e6))
@@ -0,0 +1,41 @@
+import numpy
+import pytest
+
+from fakegrism.grism import GRISMS, TraceModel
+
+WL = numpy.linspace(4.9, 7.8, 50)
+
+
+@pytest.mark.parametrize('m', [1, 2])
+def test_single_order_trace(m):
+    trace = TraceModel(GRISMS['G1'])
+    dispersion, cross = trace.positions([m], WL)
+    reached = numpy.isfinite(dispersion[0])
+    assert reached.sum() > 1
+    assert numpy.all(numpy.diff(dispersion[0][reached]) > 0)
+    assert numpy.all(cross == 0)
+    order, wl = trace.invert(dispersion[0][reached], orders=m)
+    assert numpy.all(order == m)
+    numpy.testing.assert_allclose(wl, WL[reached], rtol=1e-10)
+
+
+def test_cross_dispersed_trace():
+    trace = TraceModel(GRISMS['G2'], xdisp=GRISMS['G1'])
+    orders = numpy.arange(14, 24)
+    dispersion, cross = trace.positions(orders, WL)
+    #the cross-dispersion grows with wavelength, the same in every order
+    assert numpy.all(numpy.diff(cross, axis=1) > 0)
+    assert numpy.all(cross == cross[:1])
+    reached = numpy.isfinite(dispersion)
+    for row in dispersion:
+        assert numpy.all(numpy.diff(row[numpy.isfinite(row)]) > 0)
+    m = numpy.broadcast_to(orders[:, numpy.newaxis], dispersion.shape)
+    for candidates in (None, orders):
+        order, wl = trace.invert(dispersion[reached], cross[reached], candidates)
+        numpy.testing.assert_array_equal(order, m[reached])
+        numpy.testing.assert_allclose(wl, numpy.broadcast_to(WL, dispersion.shape)[reached], rtol=1e-10)
+
+
+def test_single_order_inversion_needs_the_order():
+    with pytest.raises(ValueError):
+        TraceModel(GRISMS['G1']).invert(numpy.zeros(3))
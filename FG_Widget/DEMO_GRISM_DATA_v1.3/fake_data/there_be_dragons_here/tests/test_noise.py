@@ -0,0 +1,41 @@
+import numpy
+import pytest
+
+from fakegrism.noise import NoiseModel
+from fakegrism.pipeline import make_config, generate
+
+N_FRAMES = 5
+
+
+@pytest.fixture(scope='module')
+def reference():
+    return generate(make_config(preset='G1xG2', n_frames=N_FRAMES, seed=3), noise_chunk=1, processes=1)['frames']
+
+
+@pytest.mark.parametrize('processes', [1, 2])
+@pytest.mark.parametrize('chunk', [1, 2, N_FRAMES])
+def test_frames_do_not_depend_on_chunks(reference, chunk, processes):
+    frames = generate(make_config(preset='G1xG2', n_frames=N_FRAMES, seed=3), noise_chunk=chunk, processes=processes)['frames']
+    numpy.testing.assert_array_equal(frames, reference)
+
+
+@pytest.mark.parametrize('chunk', [1, 2, 3, N_FRAMES])
+def test_draws_do_not_depend_on_chunks(chunk):
+    shapes = [(7, 3), (4, 5)]
+    whole = list(NoiseModel(seed=1, dark_current=2.0).chunks(N_FRAMES, N_FRAMES, 6, 4, shapes))
+    parts = list(NoiseModel(seed=1, dark_current=2.0).chunks(N_FRAMES, chunk, 6, 4, shapes))
+    assert len(parts) == -(-N_FRAMES//chunk)
+    numpy.testing.assert_array_equal(numpy.concatenate([pixel for pixel, sky in parts]), whole[0][0])
+    for k in range(len(shapes)):
+        numpy.testing.assert_array_equal(numpy.array([w[k] for pixel, sky in parts for w in sky]),
+                                         numpy.array([w[k] for w in whole[0][1]]))
+
+
+def test_models_from_one_seed_sequence():
+    seed = numpy.random.SeedSequence(5)
+    first = NoiseModel(seed, dark_current=2.0)
+    second = NoiseModel(seed, dark_current=2.0)
+    numpy.testing.assert_array_equal(first.pixel_noise(2, 6, 4), second.pixel_noise(2, 6, 4))
+    numpy.testing.assert_array_equal(first.sky_weights(2, [(7, 3)])[1][0], second.sky_weights(2, [(7, 3)])[1][0])
+    #and the same as from the seed itself
+    numpy.testing.assert_array_equal(NoiseModel(5).pixel_noise(1, 6, 4), NoiseModel(seed).pixel_noise(1, 6, 4))
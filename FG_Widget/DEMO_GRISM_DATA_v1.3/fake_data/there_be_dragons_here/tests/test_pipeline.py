@@ -0,0 +1,26 @@
+import numpy
+import pytest
+
+from fakegrism.fitsio import read_cube
+from fakegrism.pipeline import NodSequence, generate
+
+
+@pytest.mark.parametrize('config', [{}, {'tile_rows': 64}])
+def test_every_iteration_gives_the_same_frames(tmp_path, config):
+    sequence = NodSequence(preset='G1xG2', seed=3, n_frames=3, **config)
+    first = sequence.frames()
+    numpy.testing.assert_array_equal(sequence.frames(), first)
+    numpy.testing.assert_array_equal(numpy.array(list(sequence)), first)
+    sequence.write(str(tmp_path / 'frames.fits'))
+    numpy.testing.assert_array_equal(read_cube(str(tmp_path / 'frames.fits')), first)
+    numpy.testing.assert_array_equal(generate(preset='G1xG2', seed=3, n_frames=3, **config)['frames'], first)
+
+
+def test_telluric_spectrum_needs_column_wavelengths():
+    with pytest.raises(ValueError, match='column wavelengths'):
+        NodSequence(preset='G1xG2', atran='R1000', n_frames=1)
+
+
+def test_per_order_psfs_need_column_wavelengths():
+    with pytest.raises(ValueError, match='column wavelengths'):
+        NodSequence(preset='G1xG2', psf_wavelength='order', n_frames=1)
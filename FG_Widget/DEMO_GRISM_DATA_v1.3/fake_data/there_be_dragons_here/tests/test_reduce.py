@@ -0,0 +1,16 @@
+import pytest
+
+from fakegrism.pipeline import NodSequence
+from fakegrism.reduce import reduce_nods, validate
+
+
+def test_reduction_recovers_the_truth():
+    sequence = NodSequence(preset='G1', seed=5, n_frames=8)
+    frames = sequence.frames()
+    extracted = reduce_nods(frames, sequence.config)
+    assert extracted['optimal'][0].shape == (4, len(extracted['columns'][0]))
+    for row in validate(frames, sequence.config, sequence.spectrum):
+        scale, rms, noise = row['optimal']
+        assert scale == pytest.approx(1.0, rel=0.01)
+        #the residuals are those of the noise alone
+        assert rms == pytest.approx(noise, rel=0.25)
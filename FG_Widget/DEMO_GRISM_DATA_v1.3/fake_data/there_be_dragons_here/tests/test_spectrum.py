@@ -0,0 +1,35 @@
+import numpy
+
+from fakegrism.spectrum import line_spectrum, order_spectra
+
+
+def test_line_position_and_flux():
+    x = numpy.linspace(0, 100, 10001)
+    flux = line_spectrum(x, [30.0, 70.0], [0.8, 0.4], [1.5, 0.5])
+    assert x[numpy.argmin(numpy.where(x < 50, flux, 1))] == 30.0
+    assert x[numpy.argmin(numpy.where(x > 50, flux, 1))] == 70.0
+    numpy.testing.assert_allclose(flux[x == 30.0], 0.2)
+    numpy.testing.assert_allclose(flux[x == 70.0], 0.6)
+    #equivalent width: depth*width*sqrt(2 pi)
+    step = x[1] - x[0]
+    for lo, hi, ew in ((0, 50, 0.8*1.5), (50, 100, 0.4*0.5)):
+        inside = (x >= lo) & (x < hi)
+        numpy.testing.assert_allclose((1-flux[inside]).sum()*step, ew*numpy.sqrt(2*numpy.pi), rtol=1e-4)
+    assert numpy.all(flux[(numpy.abs(x-30) > 7.5) & (numpy.abs(x-70) > 2.5)] == 1.0)
+
+
+def test_matches_the_product_of_profiles():
+    rng = numpy.random.default_rng(2)
+    x = rng.uniform(0, 50, 400)
+    center, depth, width = rng.uniform(0, 50, 12), rng.uniform(0, 1, 12), rng.uniform(0.5, 2, 12)
+    expected = numpy.prod(1 - depth*numpy.exp(-(x[:, numpy.newaxis]-center)**2/(2*width**2)), axis=1)
+    numpy.testing.assert_allclose(line_spectrum(x, center, depth, width, n_sigma=40), expected, rtol=1e-12)
+
+
+def test_lines_fall_in_their_orders():
+    orders = [(40, 10, 0, 0), (100, 60, 0, 0)]
+    spectra = order_spectra(orders, [0, 1], [20.0, 90.0], [0.5, 0.25], [1.0, 1.0])
+    assert [len(flux) for flux in spectra] == [30, 40]
+    assert numpy.argmin(spectra[0]) == 20-10
+    assert numpy.argmin(spectra[1]) == 90-60
+    numpy.testing.assert_allclose([spectra[0].min(), spectra[1].min()], [0.5, 0.75])
@@ -0,0 +1,42 @@
+import numpy
+import pytest
+
+from fakegrism.frames import iter_frames, iter_tiles
+from fakegrism.pipeline import NodSequence
+from fakegrism.slit import Slit
+
+SCENE = [{'offset': 0.0}, {'offset': 3.0, 'flux': 0.5, 'profile': 'gaussian', 'sigma': 1.5}]
+
+
+def tiled(sequence):
+    frames = numpy.zeros(sequence.shape, dtype=sequence.dtype)
+    for i, row, tile in sequence.tiles():
+        frames[i, row:row+len(tile)] = tile
+    return frames
+
+
+CASES = [(preset, config, tile_rows)
+         for preset, config in [('G1', {}), ('G1xG2', {}), ('G1xG2', {'subpixel': False}), ('G1xG2', {'scene': SCENE})]
+         for tile_rows in [1, 7, 64, 256]]
+#the 769 row slit images of G1_long are made again for every band they reach
+CASES += [('G1_long', {}, tile_rows) for tile_rows in [64, 100, 256]]
+
+
+@pytest.mark.parametrize('preset, config, tile_rows', CASES)
+def test_tiles_match_frames(preset, config, tile_rows):
+    whole = numpy.array(list(NodSequence(preset=preset, seed=3, n_frames=3, **config).iterate()))
+    sequence = NodSequence(preset=preset, seed=3, n_frames=3, tile_rows=tile_rows, noise_chunk=2, **config)
+    numpy.testing.assert_array_equal(tiled(sequence), whole)
+
+
+def test_tiles_on_a_pool():
+    whole = numpy.array(list(NodSequence(preset='G1xG2', seed=3, n_frames=3).iterate()))
+    sequence = NodSequence(preset='G1xG2', seed=3, n_frames=3, tile_rows=64, processes=2)
+    numpy.testing.assert_array_equal(tiled(sequence), whole)
+
+
+@pytest.mark.parametrize('frames', [iter_frames, iter_tiles])
+@pytest.mark.parametrize('chunk', [0, -1])
+def test_chunk_must_be_positive(frames, chunk):
+    with pytest.raises(ValueError, match='chunk'):
+        next(frames(Slit(2, 15), [0.25, 0.75], [(255, 0, 210, 162)], [numpy.ones(255)], seed=1, chunk=chunk))
@@ -0,0 +1,25 @@
+import numpy
+import pytest
+
+from fakegrism.truth import read_truth, write_truth
+
+ORDERS = [(40, 10, 0, 0), (100, 75, 0, 0)]
+M = [3, 4]
+
+
+@pytest.mark.parametrize('name', ['truth.npy', 'truth.fits', 'truth.txt'])
+def test_truth_round_trip(tmp_path, name):
+    rng = numpy.random.default_rng(4)
+    spectrum = [rng.random(30), rng.random(25)]
+    wavelength = [numpy.linspace(5.0, 5.5, 30), numpy.linspace(6.0, 6.4, 25)]
+    filename = str(tmp_path / name)
+    write_truth(filename, ORDERS, spectrum, M, wavelength)
+    table = read_truth(filename)
+    numpy.testing.assert_array_equal(table['pixel'], numpy.concatenate([numpy.arange(10, 40), numpy.arange(75, 100)]))
+    numpy.testing.assert_array_equal(table['flux'], numpy.concatenate(spectrum))
+    numpy.testing.assert_array_equal(table['order'], [3]*30 + [4]*25)
+    if name.endswith('.txt'):
+        #the text format has no wavelength column
+        assert numpy.all(numpy.isnan(table['wavelength']))
+    else:
+        numpy.testing.assert_array_equal(table['wavelength'], numpy.concatenate(wavelength))